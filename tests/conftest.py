@@ -1,6 +1,8 @@
 import sys
 import os
 
+import pytest
+
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
@@ -32,3 +34,10 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def no_thumbnail_workers(settings):
+    # Background threads would outlive transactional tests and race with
+    # the flush of the test database; queued jobs simply stay pending.
+    settings.THUMBNAIL_WORKERS = 0
@@ -1,11 +1,194 @@
 """Creation of interfaces for site administrators, in order to control,
-   change and create posts and groups."""
+   change and create posts and groups.
+
+   The changelists are built for tables of millions of rows: related
+   objects are joined (`list_select_related`), chosen with autocomplete
+   widgets and filtered by a typed name instead of a list of every user
+   or post, searches go through indexes and lists are not counted past
+   EXACT_COUNT_LIMIT rows."""
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+from .models import (Comment, FollowAuthor, FollowGroup, Group, Post,
+                     ThumbnailJob, User)
+from .search import COMMENT, GROUP, POST, SearchResults
+
+# Admin search shows the best matches only.
+SEARCH_RESULTS_LIMIT = 500
+# Filtered lists are counted up to this many rows; their pages past it
+# are reached by narrowing the filters.
+EXACT_COUNT_LIMIT = 10000
+
 
-from .models import Comment, FollowAuthor, Group, Post, FollowGroup
+def estimated_rows(queryset):
+    """
+    The number of rows of the table of `queryset` as the database
+    statistics have it, or the largest primary key when there are none.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Written by ANALYZE: the rows of the table come first.
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+                               [table])
+                rows = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class '
+                               'WHERE relname = %s', [table])
+                rows = [int(reltuples) for reltuples, in cursor.fetchall()]
+            else:
+                rows = []
+    except DatabaseError:
+        # No statistics gathered yet.
+        rows = []
+    if rows and max(rows) > 0:
+        return max(rows)
+    return model._default_manager.using(queryset.db).aggregate(
+        rows=Max('pk')
+    )['rows'] or 0
 
 
-class GroupAdmin(admin.ModelAdmin):
+class ApproximateCountPaginator(Paginator):
+    """
+    Estimates the size of a whole table from the statistics of the
+    database and counts a filtered list up to EXACT_COUNT_LIMIT rows,
+    instead of a `COUNT(*)` of every row.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset)
+            if estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:EXACT_COUNT_LIMIT].count()
+
+
+class NameFilter(admin.SimpleListFilter):
+    """
+    Filters by a name typed into the sidebar, a username, a slug or an
+    id looked up by `lookup`, instead of listing every related object.
+    """
+
+    template = 'admin/posts/name_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+        }
+
+    def queryset(self, request, queryset):
+        name = (self.value() or '').strip().lstrip('@#')
+        if not name:
+            return queryset
+        try:
+            return queryset.filter(**{self.lookup: name})
+        except ValueError as error:
+            raise IncorrectLookupParameters(error)
+
+
+class AuthorFilter(NameFilter):
+    title = 'автору'
+    parameter_name = 'author'
+    lookup = 'author__username'
+
+
+class UserFilter(NameFilter):
+    title = 'подписчику'
+    parameter_name = 'user'
+    lookup = 'user__username'
+
+
+class GroupFilter(NameFilter):
+    title = 'группе'
+    parameter_name = 'group'
+    lookup = 'group__slug'
+
+
+class SlugFilter(NameFilter):
+    title = 'адресу'
+    parameter_name = 'slug'
+    lookup = 'slug'
+
+
+class PostFilter(NameFilter):
+    title = 'посту (номер)'
+    parameter_name = 'post'
+    lookup = 'post__pk'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Lists neither counted twice nor counted past EXACT_COUNT_LIMIT."""
+
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class IndexedSearchMixin:
+    """
+    Looks the search term up in the full-text index of `posts.search`
+    instead of scanning `search_fields` with `icontains`.
+    """
+
+    search_kind = POST
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        ids = SearchResults(search_term, kind=self.search_kind).ids(
+            0, SEARCH_RESULTS_LIMIT
+        )
+        return queryset.filter(pk__in=ids), False
+
+
+class NamedSearchMixin:
+    """
+    Finds the rows of the user (`@username`) or the group (`#slug`) named
+    by the search term through the indexes of `user_fields` and
+    `group_fields`.
+    """
+
+    user_fields = ()
+    group_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        name = search_term.strip()
+        if not name:
+            return queryset, False
+        users = User.objects.filter(username=name.lstrip('@')).values('pk')
+        groups = Group.objects.filter(slug=name.lstrip('#')).values('pk')
+        condition = Q()
+        for field in self.user_fields:
+            condition |= Q(**{f'{field}__in': users})
+        for field in self.group_fields:
+            condition |= Q(**{f'{field}__in': groups})
+        return queryset.filter(condition), False
+
+
+class GroupAdmin(IndexedSearchMixin, LargeTableAdmin):
     """
     This class creates an interface for administering Groups.
 
@@ -18,11 +201,12 @@ class GroupAdmin(admin.ModelAdmin):
 
     list_display = ('title', 'slug', 'description')
     search_fields = ('title', 'description',)
-    list_filter = ('slug',)
+    list_filter = (SlugFilter,)
     prepopulated_fields = {"slug": ("title",)}
+    search_kind = GROUP
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchMixin, LargeTableAdmin):
     """
     This class creates an interface for administering posts.
 
@@ -34,30 +218,65 @@ class PostAdmin(admin.ModelAdmin):
     """
 
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date', 'group',)
-    empty_value_display = '-пусто-'
+    list_filter = ('pub_date', GroupFilter, AuthorFilter)
+    autocomplete_fields = ('author', 'group')
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
+    """
+    Comments are searched by the text in the search index, or by their
+    author, `@username`.
+    """
+
     list_display = ('pk', 'text', 'author', 'post', 'created')
-    search_fields = ('text', 'author')
-    list_filter = ('created', 'author', 'post')
-    empty_value_display = '-пусто-'
+    list_select_related = ('author', 'post')
+    search_fields = ('text',)
+    list_filter = ('created', AuthorFilter, PostFilter)
+    autocomplete_fields = ('author', 'post')
+    # Newest first along the primary key rather than sorting the table.
+    ordering = ('-pk',)
 
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.startswith('@'):
+            return queryset.filter(author__in=User.objects.filter(
+                username=term[1:]
+            ).values('pk')), False
+        ids = SearchResults(term, kind=COMMENT).ids(0, SEARCH_RESULTS_LIMIT)
+        return queryset.filter(pk__in=ids), False
 
-class FollowAuthorAdmin(admin.ModelAdmin):
+
+class FollowAuthorAdmin(NamedSearchMixin, LargeTableAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_filter = (UserFilter, AuthorFilter)
+    autocomplete_fields = ('user', 'author')
+    ordering = ('-pk',)
+    user_fields = ('user', 'author')
 
 
-class FollowGroupAdmin(admin.ModelAdmin):
+class FollowGroupAdmin(NamedSearchMixin, LargeTableAdmin):
     list_display = ('pk', 'user', 'group')
-    search_fields = ('user', 'group')
-    list_filter = ('user', 'group')
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'group')
+    search_fields = ('user__username', 'group__slug')
+    list_filter = (UserFilter, GroupFilter)
+    autocomplete_fields = ('user', 'group')
+    ordering = ('-pk',)
+    user_fields = ('user',)
+    group_fields = ('group',)
+
+
+class ThumbnailJobAdmin(LargeTableAdmin):
+    list_display = ('pk', 'post', 'status', 'attempts', 'created',
+                    'finished')
+    list_select_related = ('post',)
+    list_filter = ('status',)
+    raw_id_fields = ('post',)
 
 
 admin.site.register(Post, PostAdmin)
@@ -65,3 +284,4 @@ admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(FollowAuthor, FollowAuthorAdmin)
 admin.site.register(FollowGroup, FollowGroupAdmin)
+admin.site.register(ThumbnailJob, ThumbnailJobAdmin)
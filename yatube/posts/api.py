@@ -0,0 +1,188 @@
+"""Read-only JSON API of the feeds, posts and comments.
+
+Rows are read with `values()` from the querysets of the HTML views, so
+no model instances are built and related objects come from joins in the
+same query. Every list is paged by cursor (`?after=` / `?before=`, links
+in `next` and `previous`) and every endpoint takes `?fields=` to select
+the keys of its objects:
+
+    GET /api/v1/posts/?fields=id,author,excerpt&limit=20
+
+Responses are compressed with gzip when the client accepts it.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.http import urlencode
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from . import timeline
+from .models import Comment, Group, Post, User
+from .paginators import COMMENTS_ORDERING, POSTS_ORDERING, CursorPaginator
+
+# Public names of the fields and their `values()` expressions. The text
+# of posts is the sanitized HTML of `Post.text_html`.
+POST_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'text': 'text_html',
+    'excerpt': 'excerpt',
+    'image': 'image',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'comment_count': 'comment_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_view(view):
+    """GET-only, gzipped view answering errors with JSON."""
+    @require_GET
+    @gzip_page
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return _json(view(request, *args, **kwargs))
+        except ApiError as error:
+            return _json({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _selected(request, fields):
+    """Public names requested with `?fields=`, all of them by default."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = set(names) - set(fields)
+    if unknown:
+        raise ApiError(400, 'Неизвестные поля: {}. Доступны: {}.'.format(
+            ', '.join(sorted(unknown)), ', '.join(fields)
+        ))
+    return list(dict.fromkeys(names))
+
+
+def _values(queryset, names, fields, ordering=()):
+    """
+    `queryset.values()` of the selected fields plus the ordering keys
+    the cursors are made of.
+    """
+    return queryset.values(*dict.fromkeys([
+        *(field.lstrip('-') for field in ordering),
+        *(fields[name] for name in names),
+    ]))
+
+
+def _object(row, names, fields):
+    obj = {name: row[fields[name]] for name in names}
+    if 'image' in obj:
+        name = obj['image']
+        obj['image'] = default_storage.url(name) if name else None
+    return obj
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit',
+                                    settings.PAGINATOR_POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом.')
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def _link(request, **cursor):
+    params = {name: value for name, value in request.GET.items()
+              if name not in ('after', 'before')}
+    return request.build_absolute_uri(
+        '{}?{}'.format(request.path, urlencode({**params, **cursor}))
+    )
+
+
+def _page(request, queryset, fields, ordering=POSTS_ORDERING):
+    names = _selected(request, fields)
+    rows = _values(queryset, names, fields, ordering)
+    page = CursorPaginator(rows, _limit(request), ordering).get_cursor_page(
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
+    return {
+        'results': [_object(row, names, fields)
+                    for row in page.object_list],
+        'next': page.next_cursor and _link(request,
+                                           after=page.next_cursor),
+        'previous': page.previous_cursor and _link(
+            request, before=page.previous_cursor
+        ),
+    }
+
+
+def _get(queryset, message):
+    found = queryset.first()
+    if found is None:
+        raise ApiError(404, message)
+    return found
+
+
+@api_view
+def index(request):
+    return _page(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view
+def group_posts(request, slug):
+    group = _get(Group.objects.filter(slug=slug).only('pk'),
+                 'Сообщество не найдено.')
+    return _page(request, group.group_posts.all(), POST_FIELDS)
+
+
+@api_view
+def profile(request, username):
+    author = _get(User.objects.filter(username=username).only('pk'),
+                  'Пользователь не найден.')
+    return _page(request, author.posts.all(), POST_FIELDS)
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти на сайт.')
+    return _page(request, timeline.get_posts(request.user), POST_FIELDS,
+                 ordering=timeline.ORDERING)
+
+
+@api_view
+def post(request, post_id):
+    names = _selected(request, POST_FIELDS)
+    row = _get(_values(Post.objects.filter(pk=post_id), names, POST_FIELDS),
+               'Пост не найден.')
+    return _object(row, names, POST_FIELDS)
+
+
+@api_view
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise ApiError(404, 'Пост не найден.')
+    return _page(request, Comment.objects.filter(post=post_id),
+                 COMMENT_FIELDS, ordering=COMMENTS_ORDERING)
@@ -7,3 +7,6 @@ class PostsConfig(AppConfig):
     """
 
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,121 @@
+"""ETags of the post pages for conditional GET.
+
+Each function returns the validator of a page without rendering it, for
+the `condition` decorator of the view, and None when the page should be
+rendered anyway (a 404 or an empty list).
+
+* The main feed is identified by the feed version in the cache, bumped
+  on every write to posts and comments (see `feed.py`): a cache lookup.
+* Group, profile and post pages are identified by one indexed query
+  that reads the posts of the requested page (ids and `updated`, which
+  comments and thumbnails bump as well), the counters shown in the
+  header and the follow flag of the viewer. The pagination links of a
+  list page are a part of its ETag too: the number of posts of the list
+  is one of the counters read for a numbered page, and the cursors of
+  the neighbouring pages are added for a cursor page.
+
+Signed-in viewers see their own buttons and CSRF token, so their user id
+and CSRF cookie are a part of every ETag. There is no Last-Modified:
+counters and follow flags change without a timestamp to compare.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .feed import get_index_version, page_key
+from .models import FollowAuthor, FollowGroup, Post
+from .paginators import POSTS_ORDERING, paginate
+
+
+def _etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _viewer(request):
+    if not request.user.is_authenticated:
+        return None
+    return request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+
+
+def _following(request, model, field):
+    """The follow flag of the viewer as an annotation of the page rows."""
+    if not request.user.is_authenticated:
+        return {}
+    return {'following': Exists(model.objects.filter(
+        user=request.user.pk, **{field: OuterRef(field)}
+    ))}
+
+
+def _page(request, rows):
+    """
+    The rows of the requested page and the cursors of its neighbours:
+    a cursor page as `paginate` would select it, a numbered one by its
+    offset without counting the list.
+    """
+    if request.GET.get('after') or request.GET.get('before'):
+        page = paginate(request, rows)
+        return (list(page.object_list),
+                (page.previous_cursor, page.next_cursor))
+    try:
+        number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        number = 1
+    if number > settings.PAGINATOR_NUMBERED_PAGES:
+        # Redirected to its cursor or the last page, see `paginate`.
+        return [], None
+    per_page = settings.PAGINATOR_POSTS_PER_PAGE
+    return list(rows.order_by(*POSTS_ORDERING)[
+        (number - 1) * per_page:number * per_page
+    ]), None
+
+
+def _list_etag(request, posts, *fields):
+    # Cards show the group of every post.
+    rows, links = _page(request, posts.values('id', 'pub_date', 'updated',
+                                              'group__title', *fields))
+    if not rows:
+        return None
+    return _etag(_viewer(request), links,
+                 [sorted(row.items()) for row in rows])
+
+
+def index_etag(request):
+    return _etag('index', get_index_version(), page_key(request.GET),
+                 _viewer(request))
+
+
+def group_etag(request, slug):
+    following = _following(request, FollowGroup, 'group')
+    posts = Post.objects.filter(group__slug=slug).annotate(**following)
+    return _list_etag(request, posts, 'group__title', 'group__description',
+                      'group__posts_count', 'group__followers_count',
+                      *following)
+
+
+def profile_etag(request, username):
+    following = _following(request, FollowAuthor, 'author')
+    posts = Post.objects.filter(author__username=username).annotate(
+        **following
+    )
+    return _list_etag(request, posts, 'author__first_name',
+                      'author__last_name', 'author__counters__posts_count',
+                      'author__counters__followers_count',
+                      'author__counters__following_count', *following)
+
+
+def post_etag(request, username, post_id):
+    following = _following(request, FollowAuthor, 'author')
+    row = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).annotate(**following).values(
+        'updated', 'comment_count', 'group__title', 'author__first_name',
+        'author__last_name', 'author__counters__posts_count',
+        'author__counters__followers_count',
+        'author__counters__following_count', *following
+    ).first()
+    if row is None:
+        return None
+    # Comments are paged by the `after` cursor.
+    return _etag(_viewer(request), request.GET.get('after'),
+                 sorted(row.items()))
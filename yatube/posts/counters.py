@@ -0,0 +1,74 @@
+"""Denormalized counters of users, groups and posts.
+
+The counters are changed with `UPDATE ... SET x = x + 1` from the signal
+handlers in `signals.py`, and `recount_all` rebuilds them from scratch
+(see the `recount_counters` management command).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (Comment, FollowAuthor, FollowGroup, Group, Post, User,
+                     UserCounter)
+
+
+def _change(queryset, field, delta):
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_user(user_id, field, delta):
+    updated = _change(UserCounter.objects.filter(user=user_id), field, delta)
+    if not updated and delta > 0:
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def change_group(group_id, field, delta):
+    if group_id:
+        _change(Group.objects.filter(pk=group_id), field, delta)
+
+
+def change_post(post_id, field, delta):
+    _change(Post.objects.filter(pk=post_id), field, delta)
+
+
+def _count(queryset, field):
+    """Correlated COUNT(*) of `queryset` rows whose `field` is the outer pk."""
+    counted = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def recount_users(users=None):
+    users = User.objects.all() if users is None else users
+    UserCounter.objects.bulk_create(
+        (UserCounter(user_id=pk) for pk in users.values_list('pk', flat=True)),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    user_ids = users.values('pk')
+    counters = UserCounter.objects.filter(user__in=user_ids)
+    counters.update(
+        followers_count=_count(FollowAuthor.objects.all(), 'author'),
+        following_count=_count(FollowAuthor.objects.all(), 'user'),
+        posts_count=_count(Post.objects.all(), 'author'),
+    )
+
+
+def recount_groups(groups=None):
+    groups = Group.objects.all() if groups is None else groups
+    groups.update(
+        followers_count=_count(FollowGroup.objects.all(), 'group'),
+        posts_count=_count(Post.objects.all(), 'group'),
+    )
+
+
+def recount_posts():
+    Post.objects.update(
+        comment_count=_count(Comment.objects.all(), 'post'),
+    )
+
+
+def recount_all():
+    recount_users()
+    recount_groups()
+    recount_posts()
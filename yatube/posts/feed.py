@@ -0,0 +1,185 @@
+"""Cached post feeds.
+
+Pages of the main feed are stored in the cache already evaluated, so
+a request served from the cache does not touch the database. Every
+write to `Post` or `Comment` bumps the feed version (see `signals.py`),
+which makes all previously cached pages unreachable at once. A page is
+computed by one request at a time, see `yatube/stampede.py`.
+
+Only the first INDEX_CACHED_PAGES pages are cached. A cursor of
+`?after=`/`?before=` can name any post, so a cursor page is cached only
+when a cached page of the same version links to it: the depth of every
+linked cursor is kept in the cache next to the pages. Other cursors are
+read from the database.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Prefetch, Subquery
+
+from yatube.caches import cache_key
+from yatube.local_cache import local_cache
+from yatube.routers import primary_reads
+from yatube.stampede import get_or_compute
+
+from .models import Comment, Post, PostThumbnail
+from .paginators import decode_cursor, freeze_page, paginate
+
+INDEX_VERSION_KEY = cache_key('feed', 'index', 'version')
+
+
+def get_index_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        # Starting from the clock rather than from 1 keeps pages cached
+        # before the counter was evicted from being served again; in
+        # nanoseconds, as the local tier of a process (see
+        # yatube/local_cache.py) may hold pages from the last second.
+        version = time.time_ns()
+        cache.add(INDEX_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def get_feed_queryset(queryset=None):
+    """
+    Returns posts prepared for `includes/post_item.html`.
+
+    Authors and groups are joined and the latest `FEED_COMMENTS_PER_POST`
+    comments of every post are fetched with their authors in one extra
+    query, so a page of posts costs the same number of queries whatever
+    its size. The number of comments is stored in `Post.comment_count`.
+    Thumbnails are attached to the page by `attach_thumbnails`.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    latest_ids = Comment.objects.filter(
+        post=OuterRef('post')
+    ).order_by('-created', '-id').values('id')
+    recent_comments = Comment.objects.filter(
+        id__in=Subquery(latest_ids[:settings.FEED_COMMENTS_PER_POST])
+    ).select_related('author')
+    return queryset.select_related('author', 'group').prefetch_related(
+        Prefetch('comments', queryset=recent_comments,
+                 to_attr='recent_comments')
+    )
+
+
+def _thumbnails_key(post):
+    # Saving a post and building its thumbnails bump `updated`.
+    return cache_key('thumbnails', post.pk, post.updated.timestamp())
+
+
+def attach_thumbnails(posts):
+    """
+    Sets `page_thumbnails`, the thumbnails of the post image by geometry,
+    on every post of a page. They are read from the local tier of the
+    process, then from the shared cache with one `get_many` and the ones
+    missing from both with one query, so a page costs the same whatever
+    the number of images.
+    """
+    keys = {}
+    for post in posts:
+        post.page_thumbnails = {}
+        if post.image:
+            keys[_thumbnails_key(post)] = post
+    cached = local_cache.get_many(list(keys)) if keys else {}
+    shared = [key for key in keys if key not in cached]
+    if shared:
+        found = cache.get_many(shared)
+        local_cache.set_many(found,
+                             timeout=settings.POST_THUMBNAILS_CACHE_TIMEOUT)
+        cached.update(found)
+    missing = {key: post for key, post in keys.items() if key not in cached}
+    if missing:
+        found = {key: {} for key in missing}
+        key_of = {post.pk: key for key, post in missing.items()}
+        for thumbnail in PostThumbnail.objects.filter(
+                post__in=[post.pk for post in missing.values()]):
+            found[key_of[thumbnail.post_id]][thumbnail.geometry] = thumbnail
+        cache.set_many(found,
+                       timeout=settings.POST_THUMBNAILS_CACHE_TIMEOUT)
+        local_cache.set_many(found,
+                             timeout=settings.POST_THUMBNAILS_CACHE_TIMEOUT)
+        cached.update(found)
+    for key, post in keys.items():
+        post.page_thumbnails = cached[key]
+    return posts
+
+
+def invalidate_index():
+    """Makes every cached page of the main feed stale."""
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _cursor_page_key(name, token):
+    return '{}-{}'.format(name, hashlib.md5(token.encode()).hexdigest())
+
+
+def page_key(params):
+    """
+    Identifies the requested page by its number or by its cursor.
+    A malformed cursor gives the first page, as in `paginate`.
+    """
+    for name in ('after', 'before'):
+        token = params.get(name)
+        if token and decode_cursor(token, Post.objects.all()) is not None:
+            return _cursor_page_key(name, token)
+    try:
+        number = max(int(params.get('page')), 1)
+    except (TypeError, ValueError):
+        number = 1
+    return 'page-{}'.format(number)
+
+
+def _depth_key(version, key):
+    return cache_key('feed', 'index', version, 'depth', key)
+
+
+def _depth(version, key):
+    """The number of the page, None for a cursor no cached page links to."""
+    if key.startswith('page-'):
+        return int(key[len('page-'):])
+    return cache.get(_depth_key(version, key))
+
+
+def _link_cursors(version, page, depth):
+    """Lets the cursor pages linked from a cached page be cached too."""
+    linked = {}
+    if page.next_cursor and depth < settings.INDEX_CACHED_PAGES:
+        linked[_cursor_page_key('after', page.next_cursor)] = depth + 1
+    if getattr(page, 'previous_cursor', None) and depth > 1:
+        linked[_cursor_page_key('before', page.previous_cursor)] = depth - 1
+    if linked:
+        cache.set_many(
+            {_depth_key(version, key): value
+             for key, value in linked.items()},
+            timeout=settings.INDEX_CACHE_TIMEOUT
+        )
+
+
+def get_index_page(request):
+    """Returns the requested page of the main feed, cached when possible."""
+    version = get_index_version()
+    key = page_key(request.GET)
+    depth = _depth(version, key)
+
+    def compute():
+        # A page read from a replica could lag behind the version it is
+        # cached under, and every client would get it until the next
+        # write (see yatube/routers.py).
+        with primary_reads():
+            page = paginate(request, get_feed_queryset())
+            attach_thumbnails(page)
+            if depth is not None:
+                _link_cursors(version, page, depth)
+            return freeze_page(page)
+
+    if depth is None or depth > settings.INDEX_CACHED_PAGES:
+        return compute()
+    return get_or_compute(cache_key('feed', 'index', version, key), compute,
+                          settings.INDEX_CACHE_TIMEOUT)
@@ -0,0 +1,162 @@
+"""Subscriptions to many authors and groups at once.
+
+`follow()` writes all the new subscriptions of a user in one transaction
+with `bulk_create(ignore_conflicts=True)`: the unique constraints of
+`FollowAuthor` and `FollowGroup` skip the ones that already exist, even
+if another request has just made them. `bulk_create` sends no signals,
+so the follow feed is backfilled here by one query, the counters of the
+user, the authors and the groups are recounted and their cached pages
+purged. `unfollow()` deletes
+subscriptions through the signal handlers of `signals.py`.
+
+`csv_lines()` and `json_lines()` stream the subscriptions of a user for
+download, and `parse()` reads both formats back.
+"""
+import csv
+import io
+import json
+import re
+from collections import namedtuple
+from itertools import chain
+
+from django.db import transaction
+
+from . import counters, page_cache, timeline
+from .models import FollowAuthor, FollowGroup, Group, User
+
+AUTHOR = 'author'
+GROUP = 'group'
+CSV_HEADER = ('kind', 'name')
+
+# Numbers of subscriptions made or removed and the names not found.
+Result = namedtuple('Result', ['authors', 'groups', 'missing'])
+
+
+def split_names(text):
+    """Names separated by spaces, commas or lines, without @ and #."""
+    return [name.lstrip('@#') for name in re.split(r'[\s,;]+', text)
+            if name.lstrip('@#')]
+
+
+def parse(content):
+    """
+    Authors and groups of a file made by `csv_lines` or `json_lines`.
+    Raises ValueError when the file is in neither format.
+    """
+    content = content.lstrip('\ufeff').strip()
+    if content.startswith('{'):
+        data = json.loads(content)
+        authors, groups = data.get('authors', []), data.get('groups', [])
+        if not (isinstance(authors, list) and isinstance(groups, list)):
+            raise ValueError('authors and groups must be lists')
+        if not all(isinstance(name, str) for name in authors + groups):
+            raise ValueError('names must be strings')
+        return authors, groups
+    names = {AUTHOR: [], GROUP: []}
+    for row in csv.reader(io.StringIO(content)):
+        if not row or tuple(row) == CSV_HEADER:
+            continue
+        if len(row) != 2 or row[0] not in names:
+            raise ValueError(f'unexpected row: {row}')
+        names[row[0]].append(row[1])
+    return names[AUTHOR], names[GROUP]
+
+
+def _found(queryset, field, names):
+    return dict(queryset.filter(**{f'{field}__in': names}).values_list(
+        field, 'pk'
+    ))
+
+
+def follow(user, authors=(), groups=()):
+    """Subscribes `user` to the authors and groups named."""
+    with transaction.atomic():
+        author_ids = _found(User.objects.exclude(pk=user.pk), 'username',
+                            authors)
+        group_ids = _found(Group.objects.all(), 'slug', groups)
+        new_authors = set(author_ids.values()) - set(
+            FollowAuthor.objects.filter(
+                user=user, author__in=author_ids.values()
+            ).values_list('author', flat=True)
+        )
+        new_groups = set(group_ids.values()) - set(
+            FollowGroup.objects.filter(
+                user=user, group__in=group_ids.values()
+            ).values_list('group', flat=True)
+        )
+        FollowAuthor.objects.bulk_create(
+            (FollowAuthor(user=user, author_id=pk) for pk in new_authors),
+            batch_size=500,
+            ignore_conflicts=True
+        )
+        FollowGroup.objects.bulk_create(
+            (FollowGroup(user=user, group_id=pk) for pk in new_groups),
+            batch_size=500,
+            ignore_conflicts=True
+        )
+        timeline.follow_authors(user.pk, new_authors)
+        timeline.follow_groups(user.pk, new_groups)
+        counters.recount_users(User.objects.filter(
+            pk__in=[user.pk, *new_authors]
+        ))
+        counters.recount_groups(Group.objects.filter(pk__in=new_groups))
+    page_cache.purge(
+        *page_cache.profile_tags([user.pk, *new_authors]),
+        *page_cache.group_tags(new_groups),
+        *([page_cache.GROUPS] if new_groups else [])
+    )
+    missing = [name for name in authors
+               if name not in author_ids and name != user.username]
+    missing += [slug for slug in groups if slug not in group_ids]
+    return Result(len(new_authors), len(new_groups), missing)
+
+
+def unfollow(user, authors=(), groups=()):
+    """Unsubscribes `user` from the authors and groups named."""
+    with transaction.atomic():
+        _, removed_authors = FollowAuthor.objects.filter(
+            user=user, author__username__in=authors
+        ).delete()
+        _, removed_groups = FollowGroup.objects.filter(
+            user=user, group__slug__in=groups
+        ).delete()
+    return Result(removed_authors.get(FollowAuthor._meta.label, 0),
+                  removed_groups.get(FollowGroup._meta.label, 0), [])
+
+
+def export_rows(user):
+    """(kind, name) of every subscription of `user`, read in chunks."""
+    for username in FollowAuthor.objects.filter(user=user).order_by(
+            'author__username').values_list('author__username',
+                                            flat=True).iterator():
+        yield AUTHOR, username
+    for slug in FollowGroup.objects.filter(user=user).order_by(
+            'group__slug').values_list('group__slug', flat=True).iterator():
+        yield GROUP, slug
+
+
+class _Echo:
+    """A file whose `write` returns the line, for `csv.writer`."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(user):
+    writer = csv.writer(_Echo())
+    return map(writer.writerow, chain([CSV_HEADER], export_rows(user)))
+
+
+def json_lines(user):
+    """`{"authors": [...], "groups": [...]}`, a name at a time."""
+    yield '{"authors": ['
+    kind, separator = AUTHOR, ''
+    for row_kind, name in export_rows(user):
+        if row_kind != kind:
+            kind, separator = row_kind, ''
+            yield '], "groups": ['
+        yield separator + json.dumps(name, ensure_ascii=False)
+        separator = ', '
+    if kind == AUTHOR:
+        yield '], "groups": ['
+    yield ']}\n'
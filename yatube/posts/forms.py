@@ -1,6 +1,8 @@
 from autoslug.settings import slugify
 from django import forms
+from django.conf import settings
 
+from . import follows
 from .models import Comment, Post, Group
 
 
@@ -31,3 +33,61 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['text']
+
+
+class FollowImportForm(forms.Form):
+    authors = forms.CharField(
+        label='Авторы', required=False, widget=forms.Textarea(attrs={
+            'rows': 4
+        }),
+        help_text='Имена пользователей через пробел, запятую '
+                  'или с новой строки.'
+    )
+    groups = forms.CharField(
+        label='Группы', required=False, widget=forms.Textarea(attrs={
+            'rows': 4
+        }),
+        help_text='Адреса (slug) групп.'
+    )
+    file = forms.FileField(
+        label='Файл', required=False,
+        help_text='CSV или JSON, выгруженный со страницы подписок.'
+    )
+    unfollow = forms.BooleanField(
+        label='Отписаться', required=False,
+        help_text='Отписаться от перечисленных вместо подписки.'
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        authors = follows.split_names(cleaned_data.get('authors') or '')
+        groups = follows.split_names(cleaned_data.get('groups') or '')
+        upload = cleaned_data.get('file')
+        if upload:
+            try:
+                file_authors, file_groups = follows.parse(
+                    upload.read().decode()
+                )
+            except (UnicodeDecodeError, ValueError):
+                raise forms.ValidationError(
+                    'Файл не похож на выгрузку подписок в CSV или JSON.'
+                )
+            authors += file_authors
+            groups += file_groups
+        if not authors and not groups:
+            raise forms.ValidationError('Укажите авторов или группы.')
+        if len(authors) + len(groups) > settings.FOLLOW_IMPORT_LIMIT:
+            raise forms.ValidationError(
+                'За раз можно изменить не больше {} подписок.'.format(
+                    settings.FOLLOW_IMPORT_LIMIT
+                )
+            )
+        cleaned_data['author_names'] = list(dict.fromkeys(authors))
+        cleaned_data['group_names'] = list(dict.fromkeys(groups))
+        return cleaned_data
+
+    def save(self, user):
+        apply = (follows.unfollow if self.cleaned_data['unfollow']
+                 else follows.follow)
+        return apply(user, self.cleaned_data['author_names'],
+                     self.cleaned_data['group_names'])
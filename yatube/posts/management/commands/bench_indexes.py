@@ -0,0 +1,119 @@
+"""Query plans and timings of the hot queries with and without indexes.
+
+Everything happens inside one transaction that is rolled back at the
+end: the optional synthetic rows as well as the dropped indexes. DDL is
+transactional on SQLite and PostgreSQL, which this benchmark targets.
+
+    python manage.py bench_indexes --posts 1000000
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import seeding, timeline
+from posts.models import Comment, FollowAuthor, Post, TimelineEntry
+
+INDEXED_MODELS = (Post, Comment, TimelineEntry)
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_sample():
+    """The user, author, group and post the hot queries are run for."""
+    post = Post.objects.exclude(group=None).order_by('comment_count').last()
+    follow = FollowAuthor.objects.first()
+    if post is None:
+        return None
+    user = follow.user if follow else post.author
+    return user, post.author, post.group, post
+
+
+def hot_queries(sample):
+    user, author, group, post = sample
+    return [
+        ('index', Post.objects.all()),
+        ('profile', Post.objects.filter(author=author)),
+        ('group_posts', Post.objects.filter(group=group)),
+        ('follow_index', timeline.get_posts(user)),
+        ('comments', Comment.objects.filter(post=post)),
+        ('following', FollowAuthor.objects.filter(user=user, author=author)),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время горячих запросов Yatube '
+            'без составных индексов и с ними.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=0,
+            help='Сколько синтетических постов добавить перед замером.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['posts']:
+                    self.seed(options['posts'])
+                sample = hot_sample()
+                if sample is None:
+                    self.stderr.write('В базе нет постов с группой.')
+                    raise Rollback
+                self.drop_indexes()
+                without = self.measure(sample, options['repeat'])
+                self.create_indexes()
+                with_indexes = self.measure(sample, options['repeat'])
+                self.report(without, with_indexes)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, posts):
+        seeding.seed(users=max(posts // 1000, 10), groups=50, posts=posts,
+                     comments=posts // 10)
+
+    def _indexes(self):
+        editor = connection.schema_editor(collect_sql=True)
+        for model in INDEXED_MODELS:
+            for index in model._meta.indexes:
+                yield editor, model, index
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for editor, model, index in self._indexes():
+                cursor.execute(str(index.remove_sql(model, editor)))
+
+    def create_indexes(self):
+        with connection.cursor() as cursor:
+            for editor, model, index in self._indexes():
+                cursor.execute(str(index.create_sql(model, editor)))
+
+    def measure(self, sample, repeat):
+        results = {}
+        for name, queryset in hot_queries(sample):
+            page = queryset[:11]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(page.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), page.explain())
+        return results
+
+    def report(self, without, with_indexes):
+        for name in without:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, results in (('без индексов', without),
+                                   ('с индексами', with_indexes)):
+                median, plan = results[name]
+                self.stdout.write(f'  {label}: {median:.2f} мс')
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,69 @@
+"""Search through the index against the `icontains` scan it replaces.
+
+    python manage.py bench_search собака "новый пост" --repeat 20
+
+Without queries, words of the latest posts are used. Timings include
+what a paginated page needs: the first page of results and their count.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import search
+from posts.models import Post
+
+
+def icontains(query, limit):
+    condition = Q()
+    for word in query.split():
+        condition &= (Q(text__icontains=word)
+                      | Q(comments__text__icontains=word))
+    found = Post.objects.filter(condition).distinct()
+    return found.count(), list(found[:limit])
+
+
+def indexed(query, limit):
+    found = search.SearchResults(query)
+    return found.count(), found[:limit]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по индексу с перебором постов '
+            'через icontains.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*',
+                            help='Поисковые запросы.')
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help='Сколько раз выполнять каждый запрос.'
+        )
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or self.sample_queries()
+        limit = settings.PAGINATOR_POSTS_PER_PAGE
+        backend = type(search.get_backend()).__name__
+        for query in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(query))
+            for label, method in (('icontains', icontains),
+                                  (backend, indexed)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    count, page = method(query, limit)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'  {label}: {statistics.median(timings):.2f} мс, '
+                    f'найдено: {count}'
+                )
+
+    def sample_queries(self):
+        words = []
+        for text in Post.objects.values_list('text', flat=True)[:5]:
+            words.extend(
+                word for word in search.terms(text) if len(word) > 3
+            )
+        return list(dict.fromkeys(words))[:5] or ['пост']
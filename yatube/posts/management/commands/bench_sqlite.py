@@ -0,0 +1,209 @@
+"""Concurrent reads and writes under the SQLite profiles.
+
+Every profile of `yatube/sqlite.py` is run on its own copy of the
+database, in rollback-journal mode as SQLite creates databases, so the
+real one is never written. Reader threads run the hot queries of
+`bench_indexes`; writer threads add comments and posts as the views do,
+a transaction each. After every operation a thread closes its connection
+as Django does when a request ends, unless the profile keeps it for
+CONN_MAX_AGE.
+
+    python manage.py seed_yatube --users 10000 --posts 200000
+    python manage.py bench_sqlite --readers 8 --writers 2 --duration 10
+"""
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from posts.models import Comment, Post
+from yatube.sqlite import PROFILES, database_profile
+
+from .bench_indexes import hot_queries, hot_sample
+
+ALIAS = 'bench_sqlite'
+PAGE_SIZE = 11
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return None
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def insert_sql(model, fields):
+    quote = connection.ops.quote_name
+    return 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(model._meta.get_field(name).column)
+                  for name in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+
+
+class Workload:
+    """The statements of the readers and writers, compiled once."""
+
+    def __init__(self, sample):
+        user, author, group, post = sample
+        self.reads = [
+            queryset[:PAGE_SIZE].query.sql_with_params()
+            for _, queryset in hot_queries(sample)
+        ]
+        self.post_id, self.author_id = post.pk, user.pk
+        self.group_id = group.pk
+        self.comment_sql = insert_sql(Comment, ('post', 'author', 'text',
+                                                'created'))
+        self.post_sql = insert_sql(Post, (
+            'author', 'group', 'text', 'text_html', 'excerpt', 'pub_date',
+            'updated', 'comment_count'
+        ))
+        quote = connection.ops.quote_name
+        self.count_sql = 'UPDATE {0} SET {1} = {1} + 1 WHERE {2} = %s'.format(
+            quote(Post._meta.db_table),
+            quote(Post._meta.get_field('comment_count').column),
+            quote(Post._meta.pk.column)
+        )
+
+    def read(self, cursor, number):
+        sql, params = self.reads[number % len(self.reads)]
+        cursor.execute(sql, params)
+        cursor.fetchall()
+
+    def write(self, cursor, number):
+        now = timezone.now()
+        if number % 2:
+            cursor.execute(self.post_sql, [
+                self.author_id, self.group_id, 'Пост замера',
+                'Пост замера', 'Пост замера', now, now, 0
+            ])
+        else:
+            cursor.execute(self.comment_sql, [
+                self.post_id, self.author_id, 'Комментарий замера', now
+            ])
+            cursor.execute(self.count_sql, [self.post_id])
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременных '
+            'чтениях и записях с разными профилями базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles', nargs='+', choices=PROFILES, default=list(PROFILES),
+            help='Какие профили сравнивать.'
+        )
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Сколько потоков читают.')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='Сколько потоков пишут.')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Сколько секунд длится замер профиля.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан только на SQLite.')
+        sample = hot_sample()
+        if sample is None:
+            raise CommandError('В базе нет данных: сначала выполните '
+                               'manage.py seed_yatube.')
+        workload = Workload(sample)
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profiles']:
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self.copy_database(path)
+                results[name] = self.run(workload, name, path, options)
+        self.report(results)
+
+    def copy_database(self, path):
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            connection.connection.backup(target)
+            target.execute('PRAGMA journal_mode = delete')
+        finally:
+            target.close()
+
+    def run(self, workload, name, path, options):
+        connections.databases[ALIAS] = database_profile(name, path)
+        deadline = time.perf_counter() + options['duration']
+        stats = {'read': [], 'write': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(kind):
+            operation = getattr(workload, kind)
+            db = connections[ALIAS]
+            timings, errors, number = [], 0, 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic(using=ALIAS):
+                            with db.cursor() as cursor:
+                                operation(cursor, number)
+                    except OperationalError:
+                        # "database is locked" after the busy timeout.
+                        errors += 1
+                    else:
+                        timings.append(time.perf_counter() - started)
+                    number += 1
+                    db.close_if_unusable_or_obsolete()
+            finally:
+                db.close()
+            with lock:
+                stats[kind].extend(timings)
+                stats['errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=[kind])
+            for kind, count in (('read', options['readers']),
+                                ('write', options['writers']))
+            for _ in range(count)
+        ]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del connections.databases[ALIAS]
+        elapsed = time.perf_counter() - started
+        result = {'errors': stats['errors']}
+        for kind in ('read', 'write'):
+            timings = sorted(duration * 1000 for duration in stats[kind])
+            result[f'{kind}s_per_s'] = round(len(timings) / elapsed, 1)
+            p95 = percentile(timings, 0.95)
+            result[f'{kind}_p95_ms'] = p95 and round(p95, 2)
+        return result
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'профиль':<12}{'чтений/с':>10}{'p95':>9}"
+            f"{'записей/с':>11}{'p95':>9}{'ошибок':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12}{result['reads_per_s']:>10}"
+                f"{str(result['read_p95_ms']):>9}"
+                f"{result['writes_per_s']:>11}"
+                f"{str(result['write_p95_ms']):>9}{result['errors']:>8}"
+            )
+        if {'default', 'production'} <= set(results):
+            default, production = results['default'], results['production']
+            for kind, label in (('reads', 'чтений'), ('writes', 'записей')):
+                before = default[f'{kind}_per_s']
+                after = production[f'{kind}_per_s']
+                if before:
+                    self.stdout.write(
+                        f'production / default, {label}: '
+                        f'{after / before:.1f}×'
+                    )
@@ -0,0 +1,357 @@
+"""Latency, throughput and queries of the main views on seeded data.
+
+Every scenario requests one view `--requests` times from `--concurrency`
+clients: the Django test client in this process, a WSGI server started
+here on a free port (`--server`) or any running server (`--url`), e.g.
+gunicorn or uvicorn on a copy of the database. Query counts are read from
+the Server-Timing header of `yatube.metrics`, so they are known in every
+mode. The rows written by `new_post` and `add_comment`, those of the
+benchmark reader with its text and past the ids taken at the start, are
+deleted at the end.
+
+    python manage.py seed_yatube --users 10000 --posts 200000
+    python manage.py bench_views --server --concurrency 8 \\
+        --output before.json
+    python manage.py bench_views --server --concurrency 8 \\
+        --compare before.json --threshold 0.2
+"""
+import http.client
+import json
+import math
+import re
+import resource
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.db.models import Max
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User, UserCounter
+
+SCENARIOS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index',
+             'new_post', 'add_comment')
+# Text of the rows written by the benchmark, deleted when it ends.
+MARKER = 'bench_views'
+TEXT = f'{MARKER}: текст, написанный при замере.'
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) quer')
+# Compared with the baseline by --compare: lower is better for all.
+COMPARED = ('p95_ms', 'queries')
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of sorted `values`."""
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def queries_of(server_timing):
+    found = QUERIES_RE.search(server_timing or '')
+    return int(found.group(1)) if found else None
+
+
+def peak_rss_mb():
+    # Kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ClientDriver:
+    """Requests through the Django test client, without a network."""
+
+    def __init__(self, user):
+        self.user = user
+        self.local = threading.local()
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+            self.local.client.force_login(self.user)
+        return self.local.client
+
+    def request(self, method, path, data):
+        client = self.client()
+        response = (client.post(path, data) if method == 'POST'
+                    else client.get(path))
+        return response.status_code, queries_of(
+            response.get('Server-Timing')
+        )
+
+
+class HttpDriver:
+    """Requests over keep-alive HTTP connections, one per client thread."""
+
+    def __init__(self, url, user):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+        login = Client()
+        login.force_login(user)
+        self.cookies = {
+            settings.SESSION_COOKIE_NAME:
+                login.cookies[settings.SESSION_COOKIE_NAME].value
+        }
+        self.cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token()
+
+    def connection(self):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        return self.local.connection
+
+    def _send(self, method, path, body=None, headers=None):
+        connection = self.connection()
+        headers = {
+            'Cookie': '; '.join(f'{name}={value}'
+                                for name, value in self.cookies.items()),
+            **(headers or {}),
+        }
+        try:
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server closed a keep-alive connection: reconnect once.
+            connection.close()
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+        response.read()
+        return response
+
+    def csrf_token(self):
+        response = self._send('GET', reverse('posts:new_post'))
+        cookie = SimpleCookie()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            cookie.load(header)
+        if settings.CSRF_COOKIE_NAME not in cookie:
+            raise CommandError('Сервер не выдал CSRF-токен.')
+        return cookie[settings.CSRF_COOKIE_NAME].value
+
+    def request(self, method, path, data):
+        if method == 'POST':
+            response = self._send('POST', path, urlencode(data), {
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'X-CSRFToken': self.cookies[settings.CSRF_COOKIE_NAME],
+            })
+        else:
+            response = self._send('GET', path)
+        return response.status, queries_of(
+            response.getheader('Server-Timing')
+        )
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Измеряет задержки, пропускную способность и число запросов '
+            'к базе основных страниц Yatube.')
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument(
+            '--server', action='store_true',
+            help='Запустить WSGI-сервер в этом процессе и обращаться '
+                 'к нему по HTTP.'
+        )
+        target.add_argument(
+            '--url', help='Адрес уже запущенного сервера, например '
+                          'http://127.0.0.1:8000.'
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+            help='Какие страницы измерять.'
+        )
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Сколько запросов в каждом сценарии.')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Сколько запросов сделать до замера.')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Сколько клиентов шлют запросы разом.')
+        parser.add_argument('--output',
+                            help='Файл, куда сохранить результаты в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON предыдущего запуска для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 и числа запросов при --compare, '
+                 'доля от прежнего значения.'
+        )
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG = True: Django хранит все SQL-запросы, '
+                              'задержки будут выше рабочих.')
+        sample = self.sample()
+        last_ids = self.last_ids()
+        server = None
+        if options['server']:
+            server = self.start_server()
+            url = 'http://{}:{}'.format(*server.server_address)
+            driver = HttpDriver(url, sample['reader'])
+        elif options['url']:
+            driver = HttpDriver(options['url'], sample['reader'])
+        else:
+            driver = ClientDriver(sample['reader'])
+        try:
+            results = {
+                name: self.run(driver, *self.scenario(name, sample),
+                               options)
+                for name in options['scenarios']
+            }
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+            self.delete_written(sample['reader'], last_ids)
+        report = {
+            'mode': ('server' if server else 'url' if options['url']
+                     else 'client'),
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'dataset': {'users': User.objects.count(),
+                        'posts': Post.objects.count(),
+                        'comments': Comment.objects.count()},
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'scenarios': results,
+        }
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline), report,
+                             options['threshold'])
+
+    def sample(self):
+        """The busiest reader, author, group and post of the dataset."""
+        reader = UserCounter.objects.order_by('-following_count').first()
+        author = UserCounter.objects.order_by('-followers_count').first()
+        group = Group.objects.order_by('-posts_count').first()
+        post = Post.objects.order_by('-comment_count', '-pk').first()
+        if None in (reader, group, post):
+            raise CommandError('В базе нет данных: сначала выполните '
+                               'manage.py seed_yatube.')
+        return {'reader': reader.user, 'author': author.user,
+                'group': group, 'post': post}
+
+    def last_ids(self):
+        return {model: model.objects.aggregate(last=Max('pk'))['last'] or 0
+                for model in (Post, Comment)}
+
+    def delete_written(self, reader, last_ids):
+        """Deletes the rows written by the scenarios, and no other."""
+        for model, last_id in last_ids.items():
+            model.objects.filter(pk__gt=last_id, author=reader,
+                                 text=TEXT).delete()
+
+    def scenario(self, name, sample):
+        """Method, path and form data of a scenario."""
+        post = sample['post']
+        post_args = [post.author.username, post.pk]
+        return {
+            'index': ('GET', reverse('posts:index'), None),
+            'group_posts': ('GET', reverse('posts:group_posts',
+                                           args=[sample['group'].slug]),
+                            None),
+            'profile': ('GET', reverse('posts:profile',
+                                       args=[sample['author'].username]),
+                        None),
+            'post_view': ('GET', reverse('posts:post', args=post_args),
+                          None),
+            'follow_index': ('GET', reverse('posts:follow_index'), None),
+            'new_post': ('POST', reverse('posts:new_post'),
+                         {'text': TEXT, 'group': sample['group'].pk}),
+            'add_comment': ('POST', reverse('posts:add_comment',
+                                            args=post_args),
+                            {'text': TEXT}),
+        }[name]
+
+    def start_server(self):
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler,
+                                    allow_reuse_address=False)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def run(self, driver, method, path, data, options):
+        def request(_):
+            started = time.perf_counter()
+            status, queries = driver.request(method, path, data)
+            return time.perf_counter() - started, status, queries
+
+        for number in range(options['warmup']):
+            request(number)
+        started = time.perf_counter()
+        if options['concurrency'] == 1:
+            measured = list(map(request, range(options['requests'])))
+        else:
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                measured = list(executor.map(request,
+                                             range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(duration * 1000 for duration, _, _ in measured)
+        queries = [count for _, _, count in measured if count is not None]
+        return {
+            'path': path,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'rps': round(len(measured) / elapsed, 1),
+            'queries': max(queries) if queries else None,
+            'mean_queries': (round(statistics.mean(queries), 1)
+                             if queries else None),
+            'errors': sum(status >= 400 for _, status, _ in measured),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['mode']}, клиентов: {report['concurrency']}, "
+            f"пик RSS: {report['peak_rss_mb']} МБ"
+        )
+        self.stdout.write(
+            f"{'сценарий':<14}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'rps':>9}{'SQL':>6}{'ошибок':>8}"
+        )
+        for name, result in report['scenarios'].items():
+            queries = '-' if result['queries'] is None else result['queries']
+            self.stdout.write(
+                f"{name:<14}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                f"{result['p99_ms']:>9}{result['rps']:>9}{queries:>6}"
+                f"{result['errors']:>8}"
+            )
+
+    def compare(self, baseline, report, threshold):
+        regressions = []
+        for name, result in report['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                continue
+            for metric in COMPARED:
+                old, new = before.get(metric), result.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold):
+                    regressions.append(f'{name}: {metric} {old} → {new}')
+            if result['errors'] > before['errors']:
+                regressions.append(
+                    f"{name}: ошибок {before['errors']} → {result['errors']}"
+                )
+        if regressions:
+            raise CommandError('Хуже прежнего запуска:\n'
+                               + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            f'Регрессий нет (порог {threshold:.0%}).'
+        ))
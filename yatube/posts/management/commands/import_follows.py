@@ -0,0 +1,54 @@
+"""Subscribes a user to many authors and groups at once.
+
+    python manage.py import_follows leo --authors ann bob --groups cats
+    python manage.py import_follows leo --file follows-leo.csv
+    python manage.py import_follows leo --authors bob --unfollow
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Подписывает пользователя на авторов и группы из списка '
+            'или из выгрузки подписок в CSV или JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Кого подписать.')
+        parser.add_argument('--authors', nargs='+', default=[],
+                            help='Имена авторов.')
+        parser.add_argument('--groups', nargs='+', default=[],
+                            help='Адреса (slug) групп.')
+        parser.add_argument('--file', help='Выгрузка подписок, CSV или JSON.')
+        parser.add_argument('--unfollow', action='store_true',
+                            help='Отписать вместо подписки.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(
+                f"Пользователь {options['username']} не найден."
+            )
+        authors, groups = list(options['authors']), list(options['groups'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as file:
+                try:
+                    file_authors, file_groups = follows.parse(file.read())
+                except ValueError as error:
+                    raise CommandError(
+                        f'Файл не похож на выгрузку подписок: {error}'
+                    )
+            authors += file_authors
+            groups += file_groups
+        if options['unfollow']:
+            result = follows.unfollow(user, authors, groups)
+            done = 'Отписок'
+        else:
+            result = follows.follow(user, authors, groups)
+            done = 'Новых подписок'
+        self.stdout.write(self.style.SUCCESS(
+            f'{done}: авторов — {result.authors}, групп — {result.groups}.'
+        ))
+        if result.missing:
+            self.stderr.write('Не найдены: ' + ', '.join(result.missing))
@@ -0,0 +1,38 @@
+"""Runs the queued thumbnail jobs, see `posts.thumbnails`.
+
+Meant for cron or a dedicated worker, and for sites running with
+THUMBNAIL_WORKERS = 0:
+
+    python manage.py process_thumbnails --missing --retry-failed
+"""
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры изображений постов из очереди задач.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Поставить в очередь изображения без миниатюр и задач.'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Повторить задачи, завершившиеся ошибкой.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Сколько задач выполнить за один запуск.'
+        )
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            queued = thumbnails.queue_missing()
+            self.stdout.write(f'Поставлено в очередь: {queued}')
+        requeued = thumbnails.requeue(failed=options['retry_failed'])
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь: {requeued}')
+        built = thumbnails.process_pending(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {built}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Заново строит поисковый индекс постов, комментариев '
+            'и сообществ.')
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        with transaction.atomic():
+            indexed = search.rebuild(backend)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано документов: {indexed} '
+            f'({type(backend).__name__}).'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики подписчиков, подписок, записей '
+            'и комментариев по данным в базе.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counters.recount_all()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
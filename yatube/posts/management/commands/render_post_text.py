@@ -0,0 +1,63 @@
+"""Fills `Post.text_html` and `Post.excerpt`, see `posts.sanitize`.
+
+Run once after the migration that added the columns, and with `--all`
+after changing the allowlist or POST_EXCERPT_LENGTH. Rewritten posts get
+a new `updated`, the version of their cached cards, and the cached pages
+showing them are purged.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import page_cache
+from posts.feed import invalidate_index
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит очищенный HTML и начало текста постов, '
+            'сохраненных без них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать заново все посты, а не только новые.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов обрабатывать за одну транзакцию.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('text', 'author', 'group')
+        if not options['all']:
+            posts = posts.filter(text_html='').exclude(text='')
+        rendered = last_id = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_id).order_by('pk')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+            now = timezone.now()
+            for post in batch:
+                post.render_text()
+                post.updated = now
+            with transaction.atomic():
+                Post.objects.bulk_update(
+                    batch, ['text_html', 'excerpt', 'updated']
+                )
+            page_cache.purge(
+                *(page_cache.post_tag(post.pk) for post in batch),
+                *page_cache.profile_tags({post.author_id for post in batch}),
+                *page_cache.group_tags({post.group_id for post in batch}
+                                       - {None})
+            )
+            rendered += len(batch)
+            last_id = batch[-1].pk
+        if rendered:
+            invalidate_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано постов: {rendered}'
+        ))
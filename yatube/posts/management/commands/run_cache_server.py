@@ -0,0 +1,36 @@
+"""Runs the Redis-compatible stand-in of `yatube.resp_server`.
+
+Lets several local processes (runserver, gunicorn workers, shells) share
+one cache without installing Redis:
+
+    python manage.py run_cache_server --port 6379
+    CACHE_URL=redis://127.0.0.1:6379/0 gunicorn yatube.wsgi -w 4
+"""
+from django.core.management.base import BaseCommand
+
+from yatube.resp_server import StandInServer
+
+
+class Command(BaseCommand):
+    help = ('Запускает локальный сервер кеша, совместимый с протоколом '
+            'Redis, для общего кеша нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host', default='127.0.0.1',
+            help='Адрес, на котором слушает сервер.'
+        )
+        parser.add_argument(
+            '--port', type=int, default=6379,
+            help='Порт сервера.'
+        )
+
+    def handle(self, *args, **options):
+        server = StandInServer((options['host'], options['port']))
+        self.stdout.write(f'Сервер кеша запущен: {server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
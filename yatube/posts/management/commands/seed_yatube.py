@@ -0,0 +1,76 @@
+"""Fills the database with synthetic data, see `posts.seeding`.
+
+    python manage.py seed_yatube --users 100000 --posts 1000000 \\
+        --comments 3000000 --images 0.2
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = ('Создает пользователей, сообщества, посты, комментарии '
+            'и подписки в объемах рабочего сайта.')
+
+    def add_arguments(self, parser):
+        volumes = parser.add_argument_group('объемы')
+        volumes.add_argument('--users', type=int, default=1000,
+                             help='Сколько создать пользователей.')
+        volumes.add_argument('--groups', type=int, default=20,
+                             help='Сколько создать сообществ.')
+        volumes.add_argument('--posts', type=int, default=10000,
+                             help='Сколько создать постов.')
+        volumes.add_argument('--comments', type=int, default=20000,
+                             help='Сколько создать комментариев.')
+        volumes.add_argument(
+            '--follows', type=int, default=20,
+            help='Сколько авторов в среднем читает пользователь.'
+        )
+        volumes.add_argument(
+            '--group-follows', type=int, default=2,
+            help='На сколько сообществ в среднем подписан пользователь.'
+        )
+        volumes.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с изображением, от 0 до 1.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель закона Ципфа для популярности авторов, '
+                 'сообществ и постов.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одно зерно дает одни и те же данные.'
+        )
+        parser.add_argument(
+            '--password', default=None,
+            help='Общий пароль пользователей; без него войти нельзя.'
+        )
+        parser.add_argument(
+            '--search-index', action='store_true',
+            help='Перестроить поисковый индекс, что на миллионах постов '
+                 'дольше самой генерации.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            created = seeding.seed(
+                users=options['users'], groups=options['groups'],
+                posts=options['posts'], comments=options['comments'],
+                follows=options['follows'],
+                group_follows=options['group_follows'],
+                images=options['images'], skew=options['skew'],
+                seed=options['seed'], password=options['password'],
+                search_index=options['search_index'],
+                log=lambda stage: self.stdout.write(f'{stage}...')
+            )
+        for name, count in created.items():
+            self.stdout.write(f'  {name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'
+        ))
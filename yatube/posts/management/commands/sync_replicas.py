@@ -0,0 +1,49 @@
+"""Copies the primary SQLite database to its replicas.
+
+The copy is made with the online backup API of SQLite: readers of a
+replica wait for the copy to end and then see the primary as it was when
+the copy began. See `yatube/routers.py`.
+
+    python manage.py sync_replicas --interval 5
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплики.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование через столько секунд; '
+                 'без него база копируется один раз.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('Реплики не заданы: укажите файлы в '
+                               'переменной окружения DATABASE_REPLICAS.')
+        if any(connections[alias].vendor != 'sqlite'
+               for alias in [DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES]):
+            raise CommandError('Копировать можно только базы SQLite.')
+        while True:
+            started = time.perf_counter()
+            self.sync()
+            self.stdout.write('Реплики обновлены за {:.2f} с.'.format(
+                time.perf_counter() - started
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in settings.REPLICA_DATABASES:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:35
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field):
+    counted = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    FollowAuthor = apps.get_model('posts', 'FollowAuthor')
+    FollowGroup = apps.get_model('posts', 'FollowGroup')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    Group = apps.get_model('posts', 'Group')
+    for model, target in ((FollowAuthor, 'author'), (FollowGroup, 'group')):
+        first_ids = model.objects.values('user', target).annotate(
+            first_id=Min('id')
+        ).values('first_id')
+        model.objects.exclude(id__in=first_ids).delete()
+    UserCounter.objects.update(
+        followers_count=_count(FollowAuthor, 'author'),
+        following_count=_count(FollowAuthor, 'user'),
+    )
+    Group.objects.update(followers_count=_count(FollowGroup, 'group'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='followauthor',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='followgroup',
+            constraint=models.UniqueConstraint(fields=('user', 'group'), name='unique_follow_group'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:48
+
+from django.db import OperationalError, migrations, models
+
+# Kept in sync with posts.search.FTS_TABLE.
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE posts_search_fts USING fts5("
+    "kind UNINDEXED, main, extra, "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def create_fts(apps, schema_editor):
+    """Creates the FTS5 index on SQLite builds that have the module."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_FTS)
+    except OperationalError:
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64, verbose_name='Слово')),
+                ('kind', models.PositiveSmallIntegerField(verbose_name='Тип документа')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Документ')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+            ],
+            options={
+                'verbose_name': 'Запись поискового индекса',
+                'verbose_name_plural': 'Записи поискового индекса',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchentry',
+            index=models.Index(fields=['object_id', 'kind'], name='search_entry_document_idx'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
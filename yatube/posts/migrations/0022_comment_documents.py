@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-18 09:40
+
+from django.db import OperationalError, migrations, models
+
+# Kept in sync with posts.search.FTS_TABLE.
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE posts_search_fts USING fts5("
+    "kind UNINDEXED, post UNINDEXED, main, extra, "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+CREATE_OLD_FTS = (
+    "CREATE VIRTUAL TABLE posts_search_fts USING fts5("
+    "kind UNINDEXED, main, extra, "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def recreate_index(create):
+    """
+    Documents are numbered anew, so the index is emptied; it is filled
+    again by `manage.py rebuild_search_index`.
+    """
+    def operation(apps, schema_editor):
+        apps.get_model('posts', 'SearchEntry').objects.all().delete()
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+        try:
+            schema_editor.execute(create)
+        except OperationalError:
+            pass
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchentry',
+            name='post_id',
+            field=models.PositiveIntegerField(null=True, verbose_name='Пост'),
+        ),
+        migrations.RunPython(recreate_index(CREATE_FTS),
+                             recreate_index(CREATE_OLD_FTS)),
+    ]
@@ -1,12 +1,40 @@
 """Database interaction models."""
 from ckeditor.fields import RichTextField
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
 
+from . import sanitize
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class CounterFieldsMixin:
+    """
+    Leaves `counter_fields` out of the saves of rows loaded from the
+    database: `posts.counters` changes them with `UPDATE ... SET x = x + 1`,
+    and writing back the values read with the row would undo the changes
+    made since. Saves naming the counters in `update_fields` still write
+    them, and a loaded row saved with its primary key cleared, to make a
+    copy, is inserted whole.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and self.pk is not None
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Group(CounterFieldsMixin, models.Model):
     """
     Stores one group where users can submit their posts.
     No strict relate.
@@ -17,6 +45,15 @@ class Group(models.Model):
                             verbose_name='Уникальный идентификатор группы')
     description = models.TextField(blank=True, null=True,
                                    verbose_name='Описание')
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+    posts_count = models.PositiveIntegerField(default=0, editable=False,
+                                              verbose_name='Записей')
+
+    counter_fields = ('followers_count', 'posts_count')
 
     class Meta:
         ordering = ['title']
@@ -30,7 +67,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(CounterFieldsMixin, models.Model):
     """
     Stores one user or admin post.
     Related to: model: `group.Group` and: model:` auth.User`.
@@ -43,13 +80,31 @@ class Post(models.Model):
     text = RichTextField(verbose_name='Текст поста', blank=False)
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата создания')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts', verbose_name='Автор')
     image = models.ImageField(upload_to='posts/', blank=True, null=True,
                               verbose_name='Изображение')
+    comment_count = models.PositiveIntegerField(default=0, editable=False,
+                                                verbose_name='Комментариев')
+    text_html = models.TextField(blank=True, editable=False,
+                                 verbose_name='Текст поста в HTML')
+    excerpt = models.TextField(blank=True, editable=False,
+                               verbose_name='Начало текста')
+
+    counter_fields = ('comment_count',)
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -59,6 +114,24 @@ class Post(models.Model):
         """
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        """Renders `text_html` and `excerpt` along with every saved text."""
+        self.render_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_html', 'excerpt'}
+        super().save(*args, **kwargs)
+
+    def render_text(self):
+        self.text_html, self.excerpt = sanitize.render(
+            self.text, settings.POST_EXCERPT_LENGTH
+        )
+
+    @property
+    def is_excerpted(self):
+        """Whether the excerpt is shorter than the text."""
+        return self.excerpt.endswith(sanitize.ELLIPSIS)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -73,6 +146,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -89,6 +166,10 @@ class FollowAuthor(models.Model):
                                verbose_name='Блогер')
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_author'),
+        ]
         verbose_name = 'Подписка на автора'
         verbose_name_plural = 'Подписки на авторов'
 
@@ -102,6 +183,152 @@ class FollowGroup(models.Model):
                               verbose_name='Группа')
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'group'],
+                                    name='unique_follow_group'),
+        ]
         verbose_name = 'Подписка на группу'
         verbose_name_plural = 'Подписки на группы'
 
+
+class UserCounter(models.Model):
+    """
+    Stored counters of one user, kept up to date by `posts.counters`
+    so that profile cards do not count rows on every render.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='counters',
+                                verbose_name='Пользователь')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписан')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='Записей')
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """
+    One post in the follow feed of one user.
+
+    Filled when a post is published (fan-out on write) and when the user
+    subscribes to an author or a group, see `posts.timeline`.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Подписчик')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Пост')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+
+class ThumbnailJob(models.Model):
+    """
+    A queued build of the thumbnails of one post image, see
+    `posts.thumbnails`.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='thumbnail_jobs',
+                             verbose_name='Пост')
+    image = models.CharField(max_length=100,
+                             verbose_name='Изображение')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата создания')
+    started = models.DateTimeField(blank=True, null=True,
+                                   verbose_name='Дата запуска')
+    finished = models.DateTimeField(blank=True, null=True,
+                                    verbose_name='Дата завершения')
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['status', 'created'],
+                         name='thumbnail_job_status_idx'),
+        ]
+        verbose_name = 'Задача миниатюр'
+        verbose_name_plural = 'Задачи миниатюр'
+
+
+class PostThumbnail(models.Model):
+    """A thumbnail of a post image built ahead of time."""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='thumbnails',
+                             verbose_name='Пост')
+    geometry = models.CharField(max_length=20, verbose_name='Размер')
+    name = models.CharField(max_length=255, verbose_name='Файл')
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'geometry'],
+                                    name='unique_post_thumbnail'),
+        ]
+        verbose_name = 'Миниатюра поста'
+        verbose_name_plural = 'Миниатюры постов'
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+class SearchEntry(models.Model):
+    """
+    One term of a document of the search index built in Python, used
+    where SQLite FTS5 is not available, see `posts.search`.
+    """
+
+    term = models.CharField(max_length=64, db_index=True,
+                            verbose_name='Слово')
+    kind = models.PositiveSmallIntegerField(verbose_name='Тип документа')
+    object_id = models.PositiveIntegerField(verbose_name='Документ')
+    # The post of a post or a comment document.
+    post_id = models.PositiveIntegerField(null=True, verbose_name='Пост')
+    weight = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['object_id', 'kind'],
+                         name='search_entry_document_idx'),
+        ]
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Записи поискового индекса'
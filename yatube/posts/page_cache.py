@@ -0,0 +1,220 @@
+"""Whole pages cached for guests.
+
+`AnonymousPageCacheMiddleware` stores the responses of the views named in
+PAGE_CACHE_VIEWS to requests without a session, keyed by the path and
+the page number, and sends them back without running the view. Only the
+first PAGINATOR_NUMBERED_PAGES pages are stored: pages named by a cursor
+or by a larger number are as many as the requests make up (the main
+feed caches the ones it links to itself, see `feed.py`). Every
+page carries tags naming what it shows: the main feed, the list of
+groups, a group, a profile or a post. A tag has a version in the cache
+and the versions of the tags of a page are a part of its key, so
+`purge()` of a tag, called from `signals.py` on writes, makes exactly the
+pages showing it stale. The main feed tag is the feed version of
+`feed.py`. A page is rendered by one request at a time, see
+`yatube/stampede.py`.
+
+Only responses that set no cookie are stored, which leaves out pages
+with a CSRF token or a session. Stored pages say `public` with an
+`s-maxage` of PAGE_CACHE_PROXY_SECONDS, so that a proxy in front of the
+site shares them too, and `max-age=0`, so that browsers revalidate them
+by their ETag. The pages of these views for signed-in users are
+`private`.
+
+Group titles and author names are shown on the cards of every list;
+editing them refreshes the pages of the group or the profile and the
+main feed, the others within PAGE_CACHE_TIMEOUT.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+
+from yatube.caches import cache_key
+from yatube.stampede import get_or_compute
+
+from .feed import INDEX_VERSION_KEY
+from .models import Group, Post, User
+
+SAFE_METHODS = ('GET', 'HEAD')
+INDEX = 'index'
+GROUPS = 'groups'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def profile_tag(username):
+    return f'profile:{username}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+# Tags of the pages of every view, from the arguments of its URL.
+VIEW_TAGS = {
+    'posts:index': lambda kwargs: [INDEX],
+    'posts:all_groups': lambda kwargs: [GROUPS],
+    'posts:group_posts': lambda kwargs: [group_tag(kwargs['slug'])],
+    'posts:profile': lambda kwargs: [profile_tag(kwargs['username'])],
+    # The post page shows the profile card of its author.
+    'posts:post': lambda kwargs: [post_tag(kwargs['post_id']),
+                                  profile_tag(kwargs['username'])],
+}
+
+
+def profile_tags(user_ids):
+    return [profile_tag(username) for username in User.objects.filter(
+        pk__in=user_ids
+    ).values_list('username', flat=True)]
+
+
+def group_tags(group_ids):
+    return [group_tag(slug) for slug in Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True)]
+
+
+def post_tags(post_id):
+    """Tags of the pages showing a post: its own, its author's and its
+    group's."""
+    tags = [post_tag(post_id)]
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if row is not None:
+        tags.append(profile_tag(row[0]))
+        if row[1]:
+            tags.append(group_tag(row[1]))
+    return tags
+
+
+def _version_key(tag):
+    if tag == INDEX:
+        return INDEX_VERSION_KEY
+    return cache_key('page', 'version', tag)
+
+
+def purge(*tags):
+    """Makes every cached page showing one of `tags` stale."""
+    for tag in set(tags):
+        key = _version_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def _versions(tags):
+    """Versions of the tags, starting the ones missing from the cache."""
+    keys = [_version_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # From the clock, as `feed.get_index_version` does.
+            found[key] = time.time_ns()
+            cache.add(key, found[key], timeout=None)
+    return [found[key] for key in keys]
+
+
+def _page_number(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+
+def _personal(request):
+    """Whether the request may get a page of its own."""
+    return any(name in request.COOKIES for name in (
+        settings.SESSION_COOKIE_NAME, CookieStorage.cookie_name,
+        settings.REPLICA_PIN_COOKIE_NAME,
+    ))
+
+
+def _storable(request, response):
+    return (request.method == 'GET' and response.status_code == 200
+            and not response.streaming and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', ''))
+
+
+def _restore(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+class AnonymousPageCacheMiddleware:
+    """Goes right after the replica middleware, so that the responses
+    stored have the headers of all the middleware below it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = self.cached_match(request)
+        if match is None:
+            return self.get_response(request)
+        if _personal(request):
+            response = self.get_response(request)
+            patch_cache_control(response, private=True)
+            return response
+
+        key = cache_key('page', *_versions(
+            VIEW_TAGS[match.view_name](match.kwargs)
+        ), request.path, _page_number(request))
+        rendered = None
+
+        def render():
+            nonlocal rendered
+            rendered = self.get_response(request)
+            if not _storable(request, rendered):
+                return None
+            patch_cache_control(rendered, public=True, max_age=0,
+                                s_maxage=settings.PAGE_CACHE_PROXY_SECONDS)
+            patch_vary_headers(rendered, ['Cookie'])
+            return {
+                'status': rendered.status_code,
+                'headers': list(rendered.items()),
+                'content': rendered.content,
+            }
+
+        timeout = settings.PAGE_CACHE_TIMEOUT
+        if (settings.REPLICA_DATABASES
+                and match.view_name in settings.REPLICA_READ_VIEWS):
+            # A replica may lag behind the versions of the key.
+            timeout = min(timeout, settings.REPLICA_PIN_SECONDS)
+        entry = get_or_compute(key, render, timeout)
+        if rendered is not None:
+            if entry is None:
+                patch_cache_control(rendered, private=True)
+            return rendered
+        response = _restore(entry)
+        return get_conditional_response(
+            request, etag=response.get('ETag'), response=response
+        )
+
+    def cached_match(self, request):
+        """The match of the requested page, None when it is not cached."""
+        if (request.method not in SAFE_METHODS
+                or not settings.PAGE_CACHE_TIMEOUT):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.view_name not in settings.PAGE_CACHE_VIEWS:
+            return None
+        if (request.GET.get('after') or request.GET.get('before')
+                or _page_number(request) > settings.PAGINATOR_NUMBERED_PAGES):
+            return None
+        return match
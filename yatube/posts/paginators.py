@@ -0,0 +1,286 @@
+"""Paginators for post lists.
+
+Numbered pages are kept for the first few pages of a list. Deeper pages
+are reached with keyset (cursor) pagination only: the page is selected
+with a `WHERE (pub_date, id) < (...)` condition instead of a growing
+OFFSET, and no COUNT(*) is issued. A deep numbered page, from an old
+link, is redirected to its cursor by `CursorRedirectMiddleware`.
+"""
+import base64
+import copy
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
+
+POSTS_ORDERING = ('-pub_date', '-id')
+# Comments are read from the oldest, as a conversation.
+COMMENTS_ORDERING = ('created', 'id')
+CURSOR_SEPARATOR = '|'
+
+
+def _field_value(item, name):
+    if isinstance(item, dict):
+        return item[name]
+    return getattr(item, name)
+
+
+def _field_names(ordering):
+    return [field.lstrip('-') for field in ordering]
+
+
+def encode_cursor(item, ordering=POSTS_ORDERING):
+    """Builds an opaque url-safe token from the ordering keys of `item`."""
+    raw = CURSOR_SEPARATOR.join(
+        str(_field_value(item, name)) for name in _field_names(ordering)
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _key_field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def decode_cursor(token, queryset, ordering=POSTS_ORDERING):
+    """
+    Returns the list of ordering key values stored in `token`,
+    or None when the token is malformed. Keys may be model fields or
+    annotations of `queryset`.
+    """
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+        parts = raw.split(CURSOR_SEPARATOR)
+        names = _field_names(ordering)
+        if len(parts) != len(names):
+            return None
+        return [
+            _key_field(queryset, name).to_python(part)
+            for name, part in zip(names, parts)
+        ]
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+class NumberedPage(Page):
+    """A regular numbered page that knows how to continue by cursor."""
+
+    is_cursor = False
+
+    @cached_property
+    def page_links(self):
+        return self.paginator.page_range[:settings.PAGINATOR_NUMBERED_PAGES]
+
+    @cached_property
+    def next_cursor(self):
+        """
+        Cursor of the next page once the numbered pages run out,
+        so that deep pages are not reached with OFFSET. Lists without
+        a keyset `ordering`, such as ranked search results, are paged
+        by number only.
+        """
+        if (self.paginator.ordering is None
+                or self.number < settings.PAGINATOR_NUMBERED_PAGES
+                or not self.has_next()):
+            return None
+        return encode_cursor(self[len(self) - 1], self.paginator.ordering)
+
+
+class NumberedPaginator(Paginator):
+    def __init__(self, object_list, per_page, ordering=POSTS_ORDERING,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = ordering
+
+    def _get_page(self, *args, **kwargs):
+        return NumberedPage(*args, **kwargs)
+
+
+class CursorPage(Page):
+    """
+    A page selected by a cursor. It has no number and its paginator
+    never counts the rows.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """
+    Keyset paginator over `ordering`, which must identify rows uniquely.
+    """
+
+    def __init__(self, object_list, per_page, ordering=POSTS_ORDERING,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = ordering
+
+    def _seek(self, values, backwards):
+        names = _field_names(self.ordering)
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != backwards
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{names[index]}__{lookup}': values[index]})
+            for name, value in zip(names[:index], values[:index]):
+                step &= Q(**{name: value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else '-' + field
+            for field in self.ordering
+        ]
+
+    def get_cursor_page(self, after=None, before=None):
+        """
+        Returns the page following the `after` cursor or preceding the
+        `before` cursor. A missing or malformed cursor gives the first page.
+        """
+        queryset = self.object_list
+        after_values = after and decode_cursor(after, queryset, self.ordering)
+        before_values = (
+            not after_values and before
+            and decode_cursor(before, queryset, self.ordering)
+        )
+        limit = self.per_page + 1
+        if before_values:
+            rows = list(
+                self.object_list
+                .filter(self._seek(before_values, backwards=True))
+                .order_by(*self._reversed_ordering())[:limit]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            next_cursor = rows and encode_cursor(rows[-1], self.ordering)
+            previous_cursor = (
+                has_more and encode_cursor(rows[0], self.ordering)
+            )
+        else:
+            queryset = self.object_list.order_by(*self.ordering)
+            if after_values:
+                queryset = queryset.filter(
+                    self._seek(after_values, backwards=False)
+                )
+            rows = list(queryset[:limit])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = has_more and encode_cursor(rows[-1], self.ordering)
+            previous_cursor = (
+                after_values and rows and encode_cursor(rows[0], self.ordering)
+            )
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=next_cursor or None,
+            previous_cursor=previous_cursor or None
+        )
+
+
+class CursorRedirect(Exception):
+    """A numbered page that is served by its cursor at `url`."""
+
+    def __init__(self, url):
+        super().__init__(url)
+        self.url = url
+
+
+class CursorRedirectMiddleware:
+    """Redirects the requests of deep numbered pages to their cursors."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, CursorRedirect):
+            return HttpResponseRedirect(exception.url)
+        return None
+
+
+def _deep_number(number):
+    """The page number when it is past PAGINATOR_NUMBERED_PAGES."""
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return None
+    return number if number > settings.PAGINATOR_NUMBERED_PAGES else None
+
+
+def _cursor_url(request, paginator, number):
+    """
+    The `?after=` address of page `number`, which is the last one when
+    `number` is past it, as `get_page` would give.
+    """
+    number = min(number, paginator.num_pages)
+    # Only the keys of the row before the page are read.
+    row = paginator.object_list.order_by(*paginator.ordering).values(
+        *_field_names(paginator.ordering)
+    )[(number - 1) * paginator.per_page - 1]
+    params = request.GET.copy()
+    params.pop('page')
+    params['after'] = encode_cursor(row, paginator.ordering)
+    return '{}?{}'.format(request.path, params.urlencode())
+
+
+def paginate(request, object_list, per_page=None, ordering=POSTS_ORDERING):
+    """
+    Picks the page requested by `?after=`/`?before=` cursors, falling back
+    to the numbered `?page=` mode used for shallow pages. A numbered page
+    past PAGINATOR_NUMBERED_PAGES of a list that has more pages raises
+    `CursorRedirect` rather than being read with OFFSET.
+    """
+    per_page = per_page or settings.PAGINATOR_POSTS_PER_PAGE
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        paginator = CursorPaginator(object_list, per_page, ordering)
+        return paginator.get_cursor_page(after=after, before=before)
+    paginator = NumberedPaginator(object_list, per_page, ordering)
+    number = _deep_number(request.GET.get('page'))
+    if (number and ordering is not None
+            and paginator.num_pages > settings.PAGINATOR_NUMBERED_PAGES):
+        raise CursorRedirect(_cursor_url(request, paginator, number))
+    return paginator.get_page(request.GET.get('page'))
+
+
+def freeze_page(page):
+    """
+    Returns `page` detached from its queryset, ready to be pickled.
+
+    The paginator keeps a reference to the lazy queryset, and pickling it
+    would evaluate the whole table. The frozen page keeps only its rows
+    and, for numbered pages, the total count.
+    """
+    page.object_list = list(page.object_list)
+    if not page.is_cursor:
+        page.paginator.count
+        page.page_links
+        page.next_cursor
+    paginator = copy.copy(page.paginator)
+    paginator.object_list = ()
+    page.paginator = paginator
+    return page
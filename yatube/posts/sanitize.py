@@ -0,0 +1,133 @@
+"""Rendering of the rich text of posts.
+
+The HTML written with CKEditor is reduced to an allowlist of tags and
+attributes: scripts, styles, event handlers and `javascript:` links are
+dropped, everything else is escaped. Line breaks become `<br>` as the
+`linebreaksbr` filter used to do in templates. The plain text of the
+post is collected on the way and cut to an excerpt.
+"""
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.html import escape
+from django.utils.text import normalize_newlines
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'del', 'em', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'span',
+    'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th',
+    'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+URL_SCHEMES = {'', 'http', 'https', 'mailto'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Tags dropped together with their content.
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template',
+                'textarea', 'select', 'title', 'head'}
+# Tags separating words of the plain text.
+BLOCK_TAGS = {'blockquote', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr',
+              'li', 'p', 'pre', 'td', 'th', 'tr'}
+ELLIPSIS = '…'
+
+SPACES_RE = re.compile(r'\s+')
+
+
+def _safe_url(url):
+    try:
+        return urlsplit(url.strip()).scheme.lower() in URL_SCHEMES
+    except ValueError:
+        return False
+
+
+class Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def _attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        result = ''
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url(value):
+                continue
+            result += ' {}="{}"'.format(name, escape(value))
+        if tag == 'a':
+            result += ' rel="nofollow"'
+        return result
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        self.html.append('<{}{}>'.format(tag, self._attributes(tag, attrs)))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        while self.open_tags:
+            closed = self.open_tags.pop()
+            self.html.append('</{}>'.format(closed))
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data).replace('\n', '<br>'))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append('</{}>'.format(self.open_tags.pop()))
+
+
+def excerpt(text, length):
+    """Cuts `text` to `length` characters at a word boundary."""
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    if not text[length].isspace() and ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' ,.;:!?-') + ELLIPSIS
+
+
+def render(text, excerpt_length):
+    """Returns the safe HTML of `text` and the excerpt of its plain text."""
+    sanitizer = Sanitizer()
+    sanitizer.feed(normalize_newlines(text or ''))
+    sanitizer.close()
+    plain = SPACES_RE.sub(' ', ''.join(sanitizer.text)).strip()
+    return ''.join(sanitizer.html), excerpt(plain, excerpt_length)
@@ -0,0 +1,356 @@
+"""Full-text search over posts and groups.
+
+Every post is a document made of its text (the main column) and every
+comment one made of its text (the extra column, ranked lower), so that
+a write of a comment updates its own document only. Documents keep the
+id of their post: a search of posts finds a post by its own document or
+by one of its comments and ranks it by the best of them. Every group is
+a document made of its title and description. HTML of the rich text
+editor is stripped before indexing.
+
+Two interchangeable backends keep the inverted index:
+
+* `Fts5Backend`, an SQLite FTS5 table ranked by bm25, used on SQLite
+  builds that have the module;
+* `IndexBackend`, an index built in Python and stored in `SearchEntry`,
+  used on any other database.
+
+The signal handlers in `signals.py` update the documents on every write;
+`manage.py rebuild_search_index` rebuilds them from scratch.
+"""
+import html
+import math
+import re
+from collections import Counter
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Case, F, FloatField, IntegerField, Max, Q, Sum,
+                              Value, When)
+from django.utils.html import strip_tags
+
+from .feed import get_feed_queryset
+from .models import Comment, Group, Post, SearchEntry
+
+POST = 0
+GROUP = 1
+COMMENT = 2
+KINDS = (POST, GROUP, COMMENT)
+
+FTS_TABLE = 'posts_search_fts'
+# bm25 weights of the main and the extra columns.
+MAIN_WEIGHT = 3.0
+EXTRA_WEIGHT = 1.0
+# Longer queries are cut: every word is one more condition.
+MAX_QUERY_TERMS = 8
+TERM_LENGTH = SearchEntry._meta.get_field('term').max_length
+
+WORD_RE = re.compile(r'\w+')
+PREFIX_END = '\uffff'
+
+
+def normalize(text):
+    """Plain lowercase text: FTS5 does not fold `ё` by itself."""
+    return html.unescape(strip_tags(text or '')).lower().replace('ё', 'е')
+
+
+def terms(text):
+    return [word[:TERM_LENGTH] for word in WORD_RE.findall(normalize(text))]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(terms(query)))[:MAX_QUERY_TERMS]
+
+
+def _prefix(word):
+    """
+    Terms starting with `word` as a range, which unlike LIKE can use
+    the index of `SearchEntry.term` on every database.
+    """
+    return Q(term__gte=word, term__lt=word + PREFIX_END)
+
+
+def _row_id(kind, object_id):
+    return object_id * len(KINDS) + kind
+
+
+class Fts5Backend:
+    """Documents are rows of an FTS5 table; every word is a prefix."""
+
+    def update(self, kind, object_id, main, extra, post_id=None):
+        # One statement: a DELETE and an INSERT from two concurrent
+        # saves of a document would race for the row id.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} '
+                f'(rowid, kind, post, main, extra) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [_row_id(kind, object_id), kind, post_id, normalize(main),
+                 normalize(extra)]
+            )
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [_row_id(kind, object_id)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def _match(self, words):
+        return ' '.join('"{}"*'.format(word) for word in words)
+
+    def search(self, kind, words, offset, limit):
+        with connection.cursor() as cursor:
+            if kind == POST:
+                # bm25() cannot be aggregated: LIMIT -1 keeps SQLite from
+                # merging the query of the documents into the grouping.
+                cursor.execute(
+                    f'SELECT post FROM (SELECT post, '
+                    f'bm25({FTS_TABLE}, 0, 0, %s, %s) AS score '
+                    f'FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s AND kind IN (%s, %s) '
+                    f'LIMIT -1) '
+                    f'GROUP BY post ORDER BY MIN(score), post DESC '
+                    f'LIMIT %s OFFSET %s',
+                    [MAIN_WEIGHT, EXTRA_WEIGHT, self._match(words), POST,
+                     COMMENT, limit, offset]
+                )
+                return [int(post_id) for post_id, in cursor.fetchall()]
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND kind = %s '
+                f'ORDER BY bm25({FTS_TABLE}, 0, 0, %s, %s), rowid DESC '
+                f'LIMIT %s OFFSET %s',
+                [self._match(words), kind, MAIN_WEIGHT, EXTRA_WEIGHT,
+                 limit, offset]
+            )
+            return [row_id // len(KINDS) for row_id, in cursor.fetchall()]
+
+    def count(self, kind, words):
+        with connection.cursor() as cursor:
+            if kind == POST:
+                cursor.execute(
+                    f'SELECT COUNT(DISTINCT post) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s AND kind IN (%s, %s)',
+                    [self._match(words), POST, COMMENT]
+                )
+            else:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s AND kind = %s',
+                    [self._match(words), kind]
+                )
+            return cursor.fetchone()[0]
+
+
+class IndexBackend:
+    """
+    Documents are split into terms in Python and stored as `SearchEntry`
+    rows weighted by term frequency. Results are ranked by tf-idf and
+    every word is matched as a prefix, as with FTS5.
+    """
+
+    def update(self, kind, object_id, main, extra, post_id=None):
+        weights = Counter()
+        for column, weight in ((main, MAIN_WEIGHT), (extra, EXTRA_WEIGHT)):
+            for term, count in Counter(terms(column)).items():
+                weights[term] += weight * (1 + math.log(count))
+        self.remove(kind, object_id)
+        SearchEntry.objects.bulk_create(
+            SearchEntry(term=term, kind=kind, object_id=object_id,
+                        post_id=post_id, weight=weight)
+            for term, weight in weights.items()
+        )
+
+    def remove(self, kind, object_id):
+        SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+    def clear(self):
+        SearchEntry.objects.all().delete()
+
+    def _matches(self, kind, words):
+        """Documents with every word, and the entries of any of them."""
+        kinds = (POST, COMMENT) if kind == POST else (kind,)
+        entries = SearchEntry.objects.filter(kind__in=kinds).filter(
+            reduce(or_, map(_prefix, words))
+        )
+        found = {
+            f'found_{index}': Max(Case(
+                When(_prefix(word), then=Value(1)),
+                default=Value(0), output_field=IntegerField()
+            ))
+            for index, word in enumerate(words)
+        }
+        return entries.values(
+            'kind', 'object_id', 'post_id'
+        ).annotate(**found).filter(
+            **{name: 1 for name in found}
+        ), entries
+
+    def _idf(self, entries, words):
+        """
+        Inverse document frequencies of `words` among the documents that
+        contain any of them, which spares counting the whole index.
+        """
+        documents = entries.values(
+            'kind', 'object_id'
+        ).distinct().count() or 1
+        frequencies = entries.aggregate(**{
+            str(index): Sum(Case(
+                When(_prefix(word), then=Value(1)),
+                default=Value(0), output_field=IntegerField()
+            ))
+            for index, word in enumerate(words)
+        })
+        return [
+            math.log(1 + documents / (frequencies[str(index)] or 1))
+            for index in range(len(words))
+        ]
+
+    def search(self, kind, words, offset, limit):
+        matches, entries = self._matches(kind, words)
+        idf = self._idf(entries, words)
+        score = Sum(Case(
+            *(When(_prefix(word), then=F('weight') * weight)
+              for word, weight in zip(words, idf)),
+            output_field=FloatField()
+        ))
+        ranked = matches.annotate(score=score)
+        if kind != POST:
+            ranked = ranked.order_by('-score', '-object_id')
+            return [row['object_id']
+                    for row in ranked[offset:offset + limit]]
+        documents, params = ranked.values(
+            'post_id', 'score'
+        ).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM ({documents}) documents '
+                f'GROUP BY post_id ORDER BY MAX(score) DESC, post_id DESC '
+                f'LIMIT %s OFFSET %s',
+                [*params, limit, offset]
+            )
+            return [post_id for post_id, in cursor.fetchall()]
+
+    def count(self, kind, words):
+        matches = self._matches(kind, words)[0]
+        if kind == POST:
+            return matches.values('post_id').distinct().count()
+        return matches.count()
+
+
+def _fts5_available():
+    return (connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names())
+
+
+@lru_cache(maxsize=None)
+def _backend(name):
+    if name == 'fts5' or name is None and _fts5_available():
+        return Fts5Backend()
+    return IndexBackend()
+
+
+def get_backend():
+    """The backend of `SEARCH_BACKEND`: 'fts5', 'index' or None for auto."""
+    return _backend(settings.SEARCH_BACKEND)
+
+
+def index_post(post_id, text=None, backend=None):
+    """Indexes the text of the post; `text` spares reading the post."""
+    backend = backend or get_backend()
+    if text is None:
+        text = Post.objects.filter(pk=post_id).values_list(
+            'text', flat=True
+        ).first()
+    if text is None:
+        backend.remove(POST, post_id)
+        return
+    backend.update(POST, post_id, text, '', post_id)
+
+
+def index_comment(comment, backend=None):
+    backend = backend or get_backend()
+    backend.update(COMMENT, comment.pk, '', comment.text, comment.post_id)
+
+
+def index_group(group, backend=None):
+    backend = backend or get_backend()
+    backend.update(GROUP, group.pk, group.title, group.description)
+
+
+def remove(kind, object_id):
+    get_backend().remove(kind, object_id)
+
+
+def _batches(queryset, fields, batch_size):
+    """Rows of `fields`, the primary key first, read along the key."""
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk')
+                    .values_list('pk', *fields)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def rebuild(backend=None, batch_size=1000):
+    """
+    Indexes every post, comment and group again. Returns the number of
+    documents.
+    """
+    backend = backend or get_backend()
+    backend.clear()
+    indexed = 0
+    for group in Group.objects.iterator():
+        index_group(group, backend)
+        indexed += 1
+    for posts in _batches(Post.objects, ('text',), batch_size):
+        for post_id, text in posts:
+            backend.update(POST, post_id, text, '', post_id)
+        indexed += len(posts)
+    for comments in _batches(Comment.objects, ('text', 'post'), batch_size):
+        for comment_id, text, post_id in comments:
+            backend.update(COMMENT, comment_id, '', text, post_id)
+        indexed += len(comments)
+    return indexed
+
+
+class SearchResults:
+    """
+    Lazy ranked results of one query, sliced by `Paginator`: only the
+    requested page and the total count are fetched.
+    """
+
+    def __init__(self, query, kind=POST, backend=None):
+        self.words = query_terms(query)
+        self.kind = kind
+        self.backend = backend or get_backend()
+
+    def count(self):
+        if not self.words:
+            return 0
+        return self.backend.count(self.kind, self.words)
+
+    def ids(self, offset, limit):
+        if not self.words:
+            return []
+        return self.backend.search(self.kind, self.words, offset, limit)
+
+    def objects(self, ids):
+        if self.kind == GROUP:
+            return Group.objects.in_bulk(ids)
+        if self.kind == COMMENT:
+            return Comment.objects.in_bulk(ids)
+        return get_feed_queryset().in_bulk(ids)
+
+    def __getitem__(self, window):
+        offset = window.start or 0
+        ids = self.ids(offset, window.stop - offset)
+        found = self.objects(ids)
+        return [found[pk] for pk in ids if pk in found]
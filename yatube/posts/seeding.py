@@ -0,0 +1,327 @@
+"""Synthetic data of production volumes for benchmarks.
+
+`seed()` writes users, groups, posts, comments and follow edges in
+batches, bypassing the signal handlers, and then brings the denormalized
+data up to date as the handlers would: follow timelines, rendered text,
+counters, thumbnail jobs and, optionally, the search index.
+
+Popularity is skewed as on real sites: followers of authors and groups,
+posts of authors and comments of posts follow a Zipf law, so a few
+authors have most of the followers while most have none. The same seed
+and volumes on the same database give the same rows.
+
+    python manage.py seed_yatube --users 100000 --posts 1000000
+"""
+import heapq
+import io
+import random
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, chain, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import (UNUSABLE_PASSWORD_PREFIX,
+                                         make_password)
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from PIL import Image, ImageDraw
+
+from . import counters, sanitize, search, thumbnails
+from .feed import invalidate_index
+from .models import (Comment, FollowAuthor, FollowGroup, Group, Post,
+                     TimelineEntry, User)
+
+BATCH_SIZE = 5000
+# Seeded posts are spread over a year from this date.
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=365)
+# Share of posts published in a group.
+GROUP_SHARE = 0.6
+IMAGES_COUNT = 8
+IMAGE_SIZE = (960, 640)
+WORDS = (
+    'город', 'река', 'утро', 'вечер', 'дорога', 'лес', 'море', 'книга',
+    'друг', 'работа', 'музыка', 'кофе', 'поезд', 'осень', 'зима', 'весна',
+    'лето', 'солнце', 'дождь', 'снег', 'кошка', 'собака', 'сад', 'дом',
+    'окно', 'история', 'фотография', 'прогулка', 'выставка', 'концерт',
+    'новый', 'старый', 'большой', 'тихий', 'яркий', 'холодный', 'теплый',
+    'быстро', 'медленно', 'сегодня', 'вчера', 'завтра', 'снова', 'очень',
+    'увидел', 'нашел', 'прочитал', 'написал', 'услышал', 'вспомнил',
+    'думаю', 'люблю', 'хочу', 'знаю', 'и', 'в', 'на', 'с', 'под', 'про',
+)
+
+
+def _bulk_create(model, objects):
+    """Writes `objects` in batches without holding them all in memory."""
+    objects = iter(objects)
+    created = 0
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return created
+        model.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def _insert(model, fields, rows):
+    """
+    Writes tuples of database values of `fields` in batches. Skipping
+    model instances, as `bulk_create` needs them, is what makes the large
+    tables several times faster to fill.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(name).column) for name in fields
+    )
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), columns, ', '.join(['%s'] * len(fields))
+    )
+    rows = iter(rows)
+    created = 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return created
+            cursor.executemany(sql, batch)
+            created += len(batch)
+
+
+def _db_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _zipf(count, skew):
+    """Cumulative weights of ranks 1..count under a Zipf law."""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+class Seeder:
+    def __init__(self, users=1000, groups=20, posts=10000, comments=20000,
+                 follows=20, group_follows=2, images=0.0, skew=1.0, seed=0,
+                 password=None, search_index=False, log=None):
+        self.rng = random.Random(seed)
+        self.volumes = {'users': users, 'groups': groups, 'posts': posts,
+                        'comments': comments}
+        self.follows = follows
+        self.group_follows = group_follows
+        self.images = images
+        self.skew = skew
+        self.password = password
+        self.search_index = search_index
+        self.log = log or (lambda message: None)
+        self.created = {}
+        # Latest posts of every author and group, as timelines keep them.
+        self.author_posts = defaultdict(self._recent)
+        self.group_posts = defaultdict(self._recent)
+
+    def _recent(self):
+        return deque(maxlen=settings.TIMELINE_BACKFILL_SIZE)
+
+    def _ranked(self, ids):
+        """`ids` in a random order of popularity with Zipf weights."""
+        ranked = list(ids)
+        self.rng.shuffle(ranked)
+        return ranked, _zipf(len(ranked), self.skew)
+
+    def _pick(self, ranked, count):
+        population, weights = ranked
+        return self.rng.choices(population, cum_weights=weights, k=count)
+
+    def _followed(self, ranked, average, exclude=None):
+        """A heavy-tailed number of distinct ids picked by popularity."""
+        # The mean of paretovariate(1.5) is 3.
+        wanted = min(int(self.rng.paretovariate(1.5) * average / 3),
+                     len(ranked[0]) - (exclude is not None))
+        picked = dict.fromkeys(
+            pk for pk in self._pick(ranked, wanted * 2) if pk != exclude
+        )
+        return list(picked)[:wanted]
+
+    def text(self, words):
+        text = ' '.join(self.rng.choices(WORDS, k=words))
+        return text[0].upper() + text[1:] + '.'
+
+    def run(self):
+        self.seed_users()
+        self.seed_groups()
+        self.seed_posts()
+        self.seed_comments()
+        self.seed_follows()
+        self.update_denormalized()
+        return {model._meta.verbose_name_plural: count
+                for model, count in self.created.items()}
+
+    def seed_users(self):
+        self.log('Пользователи')
+        first = _next_id(User)
+        self.user_ids = range(first, first + self.volumes['users'])
+        # Hashing is slow on purpose: every user shares one hash.
+        password = (make_password(self.password) if self.password
+                    else UNUSABLE_PASSWORD_PREFIX)
+        self.created[User] = _bulk_create(User, (
+            User(pk=pk, username=f'seed{pk}', password=password,
+                 date_joined=START)
+            for pk in self.user_ids
+        ))
+        self.popular_users = self._ranked(self.user_ids)
+        self.active_users = self._ranked(self.user_ids)
+
+    def seed_groups(self):
+        self.log('Сообщества')
+        first = _next_id(Group)
+        self.group_ids = range(first, first + self.volumes['groups'])
+        self.created[Group] = _bulk_create(Group, (
+            Group(pk=pk, title=f'Сообщество {pk}', slug=f'seed-{pk}',
+                  description=self.text(12))
+            for pk in self.group_ids
+        ))
+        self.popular_groups = self._ranked(self.group_ids)
+
+    def image_names(self):
+        """A few generated images shared by all the posts with one."""
+        names = []
+        for number in range(IMAGES_COUNT):
+            name = f'posts/seed/{number}.jpg'
+            if not default_storage.exists(name):
+                # Not from `self.rng`: images already stored would shift
+                # the rows generated after them.
+                palette = random.Random(number)
+                color = tuple(palette.randrange(256) for _ in range(3))
+                image = Image.new('RGB', IMAGE_SIZE, color)
+                ImageDraw.Draw(image).ellipse(
+                    (IMAGE_SIZE[0] // 4, IMAGE_SIZE[1] // 4,
+                     IMAGE_SIZE[0] * 3 // 4, IMAGE_SIZE[1] * 3 // 4),
+                    fill=tuple(255 - channel for channel in color)
+                )
+                content = io.BytesIO()
+                image.save(content, 'JPEG')
+                name = default_storage.save(name, ContentFile(
+                    content.getvalue()
+                ))
+            names.append(name)
+        return names
+
+    def post_date(self, index):
+        return START + SPAN * index / max(self.volumes['posts'], 1)
+
+    def _posts(self):
+        images = self.image_names() if self.images else []
+        for index in range(self.volumes['posts']):
+            if index % BATCH_SIZE == 0:
+                authors = iter(self._pick(self.active_users, BATCH_SIZE))
+                groups = iter(self._pick(self.popular_groups, BATCH_SIZE)
+                              if self.group_ids else [])
+            pk = self.first_post + index
+            author_id = next(authors)
+            group_id = (next(groups, None)
+                        if self.rng.random() < GROUP_SHARE else None)
+            text = self.text(min(int(self.rng.paretovariate(1.2) * 8), 400))
+            text_html, excerpt = sanitize.render(
+                text, settings.POST_EXCERPT_LENGTH
+            )
+            pub_date = _db_datetime(self.post_date(index))
+            image = (self.rng.choice(images)
+                     if self.rng.random() < self.images else None)
+            # Posts are generated in the order of dates, so the latest
+            # posts are the ones with the greatest ids.
+            self.author_posts[author_id].append((pk, pub_date))
+            if group_id:
+                self.group_posts[group_id].append((pk, pub_date))
+            yield (pk, author_id, group_id, text, text_html, excerpt,
+                   pub_date, pub_date, image, 0)
+
+    def seed_posts(self):
+        self.log('Посты')
+        self.first_post = _next_id(Post)
+        self.created[Post] = _insert(Post, (
+            'id', 'author', 'group', 'text', 'text_html', 'excerpt',
+            'pub_date', 'updated', 'image', 'comment_count'
+        ), self._posts())
+
+    def _comments(self):
+        posts = self._ranked(range(self.volumes['posts']))
+        for start in range(0, self.volumes['comments'], BATCH_SIZE):
+            count = min(BATCH_SIZE, self.volumes['comments'] - start)
+            for index in self._pick(posts, count):
+                created = self.post_date(index) + timedelta(
+                    minutes=self.rng.expovariate(1 / 600)
+                )
+                yield (self.first_post + index,
+                       self.rng.choice(self.user_ids),
+                       self.text(self.rng.randint(2, 20)),
+                       _db_datetime(created))
+
+    def seed_comments(self):
+        self.log('Комментарии')
+        if not self.volumes['posts']:
+            self.created[Comment] = 0
+            return
+        self.created[Comment] = _insert(
+            Comment, ('post', 'author', 'text', 'created'), self._comments()
+        )
+
+    def seed_follows(self):
+        self.log('Подписки и ленты')
+        authors, groups = {}, {}
+        for user_id in self.user_ids:
+            authors[user_id] = self._followed(
+                self.popular_users, self.follows, exclude=user_id
+            )
+            if self.group_ids:
+                groups[user_id] = self._followed(self.popular_groups,
+                                                 self.group_follows)
+        self.created[FollowAuthor] = _insert(FollowAuthor, (
+            'user', 'author'
+        ), (
+            (user_id, author_id)
+            for user_id, followed in authors.items()
+            for author_id in followed
+        ))
+        self.created[FollowGroup] = _insert(FollowGroup, ('user', 'group'), (
+            (user_id, group_id)
+            for user_id, followed in groups.items()
+            for group_id in followed
+        ))
+        self.created[TimelineEntry] = _insert(TimelineEntry, (
+            'user', 'post', 'pub_date'
+        ), (
+            (user_id, post_id, pub_date)
+            for user_id in self.user_ids
+            for post_id, pub_date in self.timeline(
+                authors[user_id], groups.get(user_id, ())
+            )
+        ))
+
+    def timeline(self, authors, groups):
+        """The latest posts a new follower would get, see `timeline.py`."""
+        posts = set(chain(
+            *(self.author_posts.get(pk, ()) for pk in authors),
+            *(self.group_posts.get(pk, ()) for pk in groups)
+        ))
+        return heapq.nlargest(settings.TIMELINE_BACKFILL_SIZE, posts)
+
+    def update_denormalized(self):
+        self.log('Счетчики, миниатюры и поисковый индекс')
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Group, Post]):
+                cursor.execute(sql)
+        counters.recount_all()
+        if self.images:
+            thumbnails.queue_missing()
+        if self.search_index:
+            search.rebuild()
+        invalidate_index()
+
+
+def seed(**volumes):
+    """Seeds the database, see `Seeder`. Returns the created row counts."""
+    return Seeder(**volumes).run()
@@ -0,0 +1,233 @@
+"""Signal handlers keeping caches and derived data in sync with writes."""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, page_cache, search, thumbnails, timeline
+from .feed import invalidate_index
+from .models import (Comment, FollowAuthor, FollowGroup, Group, Post,
+                     PostThumbnail, User, UserCounter)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feed(sender, **kwargs):
+    invalidate_index()
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    """
+    Keeps the stored group and image of an edited post for the post_save
+    handlers.
+    """
+    instance._previous_group_id, instance._previous_image = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group', 'image').first()
+        if instance.pk else None
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance._previous_group_id != instance.group_id:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if (instance.image.name or '') != (instance._previous_image or ''):
+        if instance._previous_image:
+            thumbnails.delete_image(instance._previous_image)
+        thumbnails.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def delete_image(sender, instance, **kwargs):
+    if instance.image:
+        thumbnails.delete_image(instance.image.name)
+
+
+@receiver(post_delete, sender=PostThumbnail)
+def delete_thumbnail(sender, instance, **kwargs):
+    thumbnails.delete_thumbnail(instance.name)
+
+
+@receiver(post_save, sender=FollowAuthor)
+def backfill_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.follow_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=FollowAuthor)
+def trim_author(sender, instance, **kwargs):
+    timeline.unfollow_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=FollowGroup)
+def backfill_group(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.follow_group(instance.user_id, instance.group_id)
+
+
+@receiver(post_delete, sender=FollowGroup)
+def trim_group(sender, instance, **kwargs):
+    timeline.unfollow_group(instance.user_id, instance.group_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        counters.change_group(instance.group_id, 'posts_count', 1)
+    elif instance._previous_group_id != instance.group_id:
+        counters.change_group(instance._previous_group_id, 'posts_count', -1)
+        counters.change_group(instance.group_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post(instance.post_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, 'comment_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_post(sender, instance, raw=False, **kwargs):
+    """Bumps `Post.updated`, the version of the cached post card."""
+    if not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            updated=timezone.now()
+        )
+
+
+@receiver(post_save, sender=FollowAuthor)
+def count_follow_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        counters.change_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=FollowAuthor)
+def uncount_follow_author(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    counters.change_user(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=FollowGroup)
+def count_follow_group(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_group(instance.group_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=FollowGroup)
+def uncount_follow_group(sender, instance, **kwargs):
+    counters.change_group(instance.group_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance.pk, text=instance.text)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    """Every comment is a document of its own."""
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove(search.COMMENT, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove(search.POST, instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(sender, instance, **kwargs):
+    search.remove(search.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, raw=False, **kwargs):
+    """The main feed is purged by `invalidate_feed`."""
+    if raw:
+        return
+    groups = {instance.group_id, getattr(instance, '_previous_group_id', None)}
+    groups.discard(None)
+    page_cache.purge(
+        page_cache.post_tag(instance.pk),
+        *page_cache.profile_tags([instance.author_id]),
+        *page_cache.group_tags(groups),
+        # Group cards show the number of posts.
+        *([page_cache.GROUPS] if groups else [])
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(*page_cache.post_tags(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(page_cache.group_tag(instance.slug),
+                         page_cache.GROUPS, page_cache.INDEX)
+
+
+@receiver(post_save, sender=FollowAuthor)
+@receiver(post_delete, sender=FollowAuthor)
+def purge_follow_author_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(*page_cache.profile_tags(
+            [instance.user_id, instance.author_id]
+        ))
+
+
+@receiver(post_save, sender=FollowGroup)
+@receiver(post_delete, sender=FollowGroup)
+def purge_follow_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(*page_cache.group_tags([instance.group_id]),
+                         page_cache.GROUPS)
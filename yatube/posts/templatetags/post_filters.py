@@ -0,0 +1,42 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import sanitize
+
+register = template.Library()
+
+
+@register.filter
+def viewer_role(post, user):
+    """
+    The only part of a post card that depends on the viewer:
+    guests see no buttons, users can comment, the author can edit.
+    """
+    if not user.is_authenticated:
+        return 'guest'
+    if user.pk == post.author_id:
+        return 'author'
+    return 'user'
+
+
+@register.filter
+def thumbnail_of(post, geometry):
+    """
+    The thumbnail of the post image built ahead of time in `geometry`,
+    or None while it is being built, see `posts.thumbnails`. Pages read
+    the thumbnails of all their posts at once with `attach_thumbnails`.
+    """
+    thumbnails = getattr(post, 'page_thumbnails', None)
+    if thumbnails is None:
+        thumbnails = {thumbnail.geometry: thumbnail
+                      for thumbnail in post.thumbnails.all()}
+    return thumbnails.get(geometry)
+
+
+@register.filter
+def sanitize_html(text):
+    """
+    Safe HTML of a text rendered on the fly, for posts saved before
+    `Post.text_html` existed and not yet run through `render_post_text`.
+    """
+    return mark_safe(sanitize.render(text, 0)[0])
@@ -0,0 +1,82 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import admin as posts_admin
+from ..models import Comment, FollowAuthor, FollowGroup, Group, Post, User
+
+COMMENTS_URL = reverse('admin:posts_comment_changelist')
+
+
+class AdminTests(TestCase):
+    """Changelists cost the same whatever the size of the tables."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser('admin', 'admin@yatube.ru',
+                                                  'admin')
+        cls.author = User.objects.create_user('author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.author,
+                               text='Первый комментарий')
+        FollowAuthor.objects.create(user=cls.admin, author=cls.author)
+        FollowGroup.objects.create(user=cls.admin, group=cls.group)
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow(self):
+        models = ('post', 'comment', 'followauthor', 'followgroup')
+        urls = [reverse(f'admin:posts_{model}_changelist') for model in models]
+        before = [self.changelist_queries(url) for url in urls]
+        for number in range(10):
+            user = User.objects.create_user(f'reader{number}')
+            group = Group.objects.create(title=f'{number}', slug=f'g{number}')
+            post = Post.objects.create(text='Ещё пост', author=user,
+                                       group=group)
+            Comment.objects.create(post=post, author=user, text='Ещё')
+            FollowAuthor.objects.create(user=user, author=self.author)
+            FollowGroup.objects.create(user=user, group=group)
+        self.assertEqual([self.changelist_queries(url) for url in urls],
+                         before)
+
+    def test_name_filters(self):
+        Comment.objects.create(post=self.post, author=self.admin,
+                               text='Второй комментарий')
+        for query in ({'author': 'author'}, {'q': '@author'},
+                      {'post': self.post.pk, 'q': 'Первый'}):
+            with self.subTest(query=query):
+                response = self.admin_client.get(COMMENTS_URL, query)
+                self.assertEqual(
+                    [comment.text for comment
+                     in response.context['cl'].result_list],
+                    ['Первый комментарий']
+                )
+        response = self.admin_client.get(COMMENTS_URL, {'post': 'пост'})
+        self.assertRedirects(response, COMMENTS_URL + '?e=1')
+
+    def test_approximate_count(self):
+        self.addCleanup(setattr, posts_admin, 'EXACT_COUNT_LIMIT',
+                        posts_admin.EXACT_COUNT_LIMIT)
+        posts_admin.EXACT_COUNT_LIMIT = 1
+        last = Comment.objects.create(post=self.post, author=self.admin,
+                                      text='Второй комментарий')
+        Comment.objects.filter(pk__lt=last.pk).delete()
+        comments = Comment.objects.all()
+        # Without statistics the largest id stands for the row count.
+        self.assertEqual(
+            posts_admin.ApproximateCountPaginator(comments, 10).count,
+            last.pk
+        )
+        self.assertEqual(posts_admin.ApproximateCountPaginator(
+            comments.filter(author=self.admin), 10
+        ).count, 1)
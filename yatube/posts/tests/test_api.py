@@ -0,0 +1,122 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, FollowAuthor, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('reader')
+        cls.author = User.objects.create_user('author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        FollowAuthor.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(text=f'Пост <b>номер</b> {number}',
+                                author=cls.author, group=cls.group)
+            for number in range(15)
+        ]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {number}')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, client=None, **params):
+        response = (client or self.client).get(url, params)
+        return response, json.loads(response.content)
+
+    def test_feeds(self):
+        urls = {
+            'index': reverse('api:index'),
+            'group_posts': reverse('api:group_posts', args=[self.group.slug]),
+            'profile': reverse('api:profile', args=[self.author.username]),
+            'follow_index': reverse('api:follow_index'),
+        }
+        for name, url in urls.items():
+            with self.subTest(feed=name):
+                response, data = self.get(url, self.reader_client)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(data['results']), 10)
+                first = data['results'][0]
+                self.assertEqual(first['id'], self.post.pk)
+                self.assertEqual(first['author'], 'author')
+                self.assertEqual(first['group'], 'group')
+                self.assertEqual(first['text'], self.post.text_html)
+                self.assertIsNone(data['previous'])
+
+    def test_fields(self):
+        _, data = self.get(reverse('api:index'), fields='id,excerpt')
+        self.assertEqual(data['results'][0], {'id': self.post.pk,
+                                              'excerpt': self.post.excerpt})
+        response, data = self.get(reverse('api:index'), fields='id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', data['detail'])
+
+    def test_cursor_pages(self):
+        _, first = self.get(reverse('api:index'), fields='id', limit=10)
+        _, second = self.get(first['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        self.assertIsNone(second['next'])
+        _, back = self.get(second['previous'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_post_and_comments(self):
+        _, data = self.get(reverse('api:post', args=[self.post.pk]),
+                           fields='id,comment_count,image')
+        self.assertEqual(data, {'id': self.post.pk, 'comment_count': 3,
+                                'image': None})
+        _, data = self.get(reverse('api:comments', args=[self.post.pk]),
+                           fields='text')
+        self.assertEqual(data['results'], [
+            {'text': f'Комментарий {number}'} for number in range(3)
+        ])
+
+    def test_errors(self):
+        response, data = self.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('detail', data)
+        for url in (reverse('api:post', args=[0]),
+                    reverse('api:comments', args=[0]),
+                    reverse('api:group_posts', args=['missing'])):
+            with self.subTest(url=url):
+                response, data = self.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', data)
+        response = self.client.post(reverse('api:index'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_gzip(self):
+        response = self.client.get(reverse('api:index'),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), 10)
+
+    def test_queries_not_above_html(self):
+        pages = {
+            'index': [],
+            'group_posts': [self.group.slug],
+            'profile': [self.author.username],
+            'follow_index': [],
+        }
+        for name, args in pages.items():
+            with self.subTest(feed=name):
+                cache.clear()
+                html = self.reader_client.get(reverse(f'posts:{name}',
+                                                      args=args))
+                cache.clear()
+                api = self.reader_client.get(reverse(f'api:{name}',
+                                                     args=args))
+                self.assertLessEqual(api.metrics.queries,
+                                     html.metrics.queries)
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from yatube.sqlite import database_profile
+
+from .. import seeding
+from ..management.commands.bench_views import SCENARIOS, TEXT
+from ..models import Comment, Post, User
+
+
+class BenchViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        seeding.seed(users=20, groups=3, posts=100, comments=200, follows=5)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'bench.json')
+
+    def bench(self, **options):
+        cache.clear()
+        call_command('bench_views', requests=5, warmup=0, stdout=StringIO(),
+                     stderr=StringIO(), **options)
+
+    def test_report(self):
+        kept = Post.objects.create(text=TEXT, author=User.objects.first())
+        self.bench(output=self.output)
+        with open(self.output) as output:
+            report = json.load(output)
+        self.assertEqual(report['mode'], 'client')
+        self.assertEqual(list(report['scenarios']), list(SCENARIOS))
+        for name, result in report['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['errors'], 0)
+                self.assertIsNotNone(result['queries'])
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        # Only the rows written by the benchmark are deleted.
+        self.assertQuerysetEqual(Post.objects.filter(text=TEXT),
+                                 [kept.pk], transform=lambda post: post.pk)
+        self.assertFalse(Comment.objects.filter(text=TEXT))
+
+    def test_regression_threshold(self):
+        self.bench(output=self.output, scenarios=['index'])
+        with open(self.output) as output:
+            baseline = json.load(output)
+        baseline['scenarios']['index']['queries'] -= 1
+        with open(self.output, 'w') as output:
+            json.dump(baseline, output)
+        with self.assertRaisesMessage(CommandError, 'index: queries'):
+            self.bench(compare=self.output, scenarios=['index'],
+                       threshold=0.0)
+
+
+class SqliteProfileTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def connect(self, profile):
+        connections.databases['profile'] = database_profile(profile,
+                                                            self.path)
+        self.addCleanup(connections.databases.pop, 'profile')
+        db = connections['profile']
+        self.addCleanup(connections.__delitem__, 'profile')
+        self.addCleanup(db.close)
+        return db
+
+    def pragma(self, db, name):
+        with db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_pragmas(self):
+        db = self.connect('production')
+        self.assertEqual(self.pragma(db, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(db, 'synchronous'), 1)
+        self.assertEqual(self.pragma(db, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(db, 'cache_size'), -65536)
+        self.assertGreater(db.settings_dict['CONN_MAX_AGE'], 0)
+
+    def test_default_profile(self):
+        db = self.connect('default')
+        self.assertEqual(self.pragma(db, 'journal_mode'), 'delete')
+        self.assertEqual(db.settings_dict['CONN_MAX_AGE'], 0)
+
+    def test_unknown_profile(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'fast'):
+            database_profile('fast', self.path)
+
+
+class BenchSqliteTests(TransactionTestCase):
+    # The database is copied with the backup API, which waits for the
+    # transactions of TestCase to end.
+
+    def setUp(self):
+        seeding.seed(users=10, groups=2, posts=50, comments=50, follows=3)
+
+    def test_report(self):
+        stdout = StringIO()
+        call_command('bench_sqlite', readers=2, writers=1, duration=0.3,
+                     stdout=stdout)
+        report = stdout.getvalue()
+        self.assertIn('production / default', report)
+        for line in report.splitlines()[1:3]:
+            with self.subTest(line=line):
+                name, reads, _, writes, _, errors = line.split()
+                self.assertGreater(float(reads), 0)
+                self.assertGreater(float(writes), 0)
+                self.assertEqual(errors, '0')
@@ -0,0 +1,414 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube import metrics
+from yatube.caches import parse_cache_url
+from yatube.local_cache import LocalCache, local_cache
+from yatube.resp import Connection, RespCache
+from yatube.resp_server import StandInServer
+from yatube.stampede import get_or_compute
+
+from ..feed import invalidate_index
+from ..paginators import encode_cursor
+from ..models import Comment, FollowAuthor, Group, Post, User
+
+INDEX_URL = reverse('posts:index')
+
+
+class CacheUrlTests(SimpleTestCase):
+    def test_backends(self):
+        cases = {
+            'locmem://': ('locmem.LocMemCache', ''),
+            'file:///var/tmp/yatube': ('filebased.FileBasedCache',
+                                       '/var/tmp/yatube'),
+            'memcached://10.0.0.1:11211,10.0.0.2:11211': (
+                'memcached.MemcachedCache',
+                ['10.0.0.1:11211', '10.0.0.2:11211']
+            ),
+        }
+        for url, (backend, location) in cases.items():
+            with self.subTest(url=url):
+                config = parse_cache_url(url)
+                self.assertTrue(config['BACKEND'].endswith(backend))
+                self.assertEqual(config['LOCATION'], location)
+                self.assertEqual(config['KEY_PREFIX'], 'yatube')
+
+    def test_options(self):
+        config = parse_cache_url(
+            'redis://:secret@10.0.0.1:6380/2'
+            '?timeout=none&key_prefix=staging&socket_timeout=1'
+        )
+        self.assertEqual(config['BACKEND'], 'yatube.resp.RespCache')
+        self.assertEqual(config['LOCATION'], 'redis://:secret@10.0.0.1:6380/2')
+        self.assertIsNone(config['TIMEOUT'])
+        self.assertEqual(config['KEY_PREFIX'], 'staging')
+        self.assertEqual(config['OPTIONS'], {'SOCKET_TIMEOUT': 1})
+
+    def test_key_scheme(self):
+        self.assertEqual(cache.make_key('feed:index:version'),
+                         'yatube:1:feed:index:version')
+        long_key = cache.make_key('x' * 300)
+        self.assertLess(len(long_key), 250)
+        self.assertNotIn(' ', cache.make_key('with space'))
+
+
+class StampedeTests(SimpleTestCase):
+    """Concurrent misses of an entry are computed once."""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        time.sleep(0.2)
+        return 'страница'
+
+    def test_single_flight(self):
+        threads_count = 8
+        avoided = metrics.recompute_totals['recomputes_avoided']
+        barrier = threading.Barrier(threads_count)
+        values = []
+
+        def request():
+            barrier.wait()
+            values.append(get_or_compute('stampede', self.compute, 60))
+
+        threads = [threading.Thread(target=request)
+                   for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(values, ['страница'] * threads_count)
+        self.assertEqual(metrics.recompute_totals['recomputes_avoided'],
+                         avoided + threads_count - 1)
+
+    def test_stale_while_revalidate(self):
+        get_or_compute('stampede', self.compute, 0)
+        # Another request is recomputing the expired entry.
+        cache.add('stampede:lock', 'other')
+        with metrics.collect() as collected:
+            value = get_or_compute('stampede', self.compute, 60)
+        self.assertEqual((value, self.computed), ('страница', 1))
+        self.assertEqual(collected.recomputes_avoided, 1)
+        self.assertIn('1 recompute avoided', collected.server_timing())
+
+    def test_early_recomputation(self):
+        """An entry that takes long to compute is refreshed early."""
+        with self.settings(CACHE_EARLY_RECOMPUTE_BETA=10 ** 9):
+            get_or_compute('stampede', self.compute, 60)
+            get_or_compute('stampede', self.compute, 60)
+        self.assertEqual(self.computed, 2)
+        get_or_compute('stampede', self.compute, 60)
+        self.assertEqual(self.computed, 2)
+
+
+class LocalCacheTests(SimpleTestCase):
+    def test_least_recently_used_go_first(self):
+        local = LocalCache()
+        with self.settings(LOCAL_CACHE_MAX_BYTES=1000):
+            for key in 'abc':
+                local.set(key, 'x' * 300)
+            local.get('a')
+            local.set('d', 'x' * 300)
+            self.assertEqual(set(local.get_many('abcd')), {'a', 'c', 'd'})
+            local.set('big', 'x' * 2000)
+            self.assertIsNone(local.get('big'))
+        self.assertEqual(local.stats()['evictions'], 1)
+        self.assertLessEqual(local.stats()['bytes'], 1000)
+
+    def test_entries_expire(self):
+        local = LocalCache()
+        local.set('key', 'value', timeout=0.05)
+        self.assertEqual(local.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertIsNone(local.get('key'))
+        self.assertEqual(local.stats()['misses'], 1)
+
+
+class StandInServerMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StandInServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def backend(self, **params):
+        return RespCache(self.server.url, {'KEY_PREFIX': 'test', **params})
+
+
+class RespCacheTests(StandInServerMixin, SimpleTestCase):
+    def setUp(self):
+        self.cache = self.backend()
+        self.cache.clear()
+
+    def test_values(self):
+        values = {'number': 42, 'text': 'пост', 'none': None,
+                  'list': [1, 'два'], 'bytes': b'\x80\x00'}
+        self.cache.set_many(values)
+        self.assertEqual(self.cache.get_many(list(values) + ['missing']),
+                         values)
+        for key, value in values.items():
+            with self.subTest(key=key):
+                self.assertEqual(self.cache.get(key, 'default'), value)
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_add_incr_delete(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 10), 11)
+        self.assertEqual(self.cache.decr('counter'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertTrue(self.cache.delete('counter'))
+        self.assertFalse(self.cache.has_key('counter'))
+
+    def test_timeouts(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('forever', 1, timeout=None)
+        self.cache.set('expired', 1, timeout=0)
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.touch('forever', timeout=0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertIsNone(self.cache.get('forever'))
+
+    def test_reconnects(self):
+        self.cache.set('key', 'value')
+        self.cache._local.connection.socket.close()
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_sent_commands_are_not_resent(self):
+        self.cache.set('key', 'value')
+        with mock.patch('yatube.resp.read_reply',
+                        side_effect=ConnectionError), \
+                mock.patch.object(Connection, 'execute', autospec=True,
+                                  side_effect=Connection.execute) as execute:
+            with self.assertRaises(ConnectionError):
+                self.cache.set('key', 'other')
+        self.assertEqual(execute.call_count, 1)
+
+    def test_incr_watches_the_key(self):
+        other_worker = self.backend()
+        self.cache.set('counter', 1)
+        key = self.cache.make_key('counter')
+        self.cache._execute(('WATCH', key))
+        other_worker.incr('counter')
+        self.assertEqual(
+            self.cache._execute(('MULTI',), ('INCRBY', key, 10), ('EXEC',)),
+            ['OK', 'QUEUED', None]
+        )
+        self.assertEqual(self.cache.incr('counter', 10), 12)
+        self.cache.set('text', 'пост')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_invalidation_between_workers(self):
+        worker, other_worker = self.backend(), self.backend()
+        worker.set('version', 1)
+        other_worker.incr('version')
+        self.assertEqual(worker.get('version'), 2)
+
+
+class SharedIndexCacheTests(StandInServerMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('test_admin')
+        Post.objects.create(text='Пост в общем кеше', author=cls.user)
+        cls.guest_client = Client()
+
+    def setUp(self):
+        shared = self.settings(
+            CACHES={'default': parse_cache_url(self.server.url)}
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        cache.clear()
+
+    def test_invalidated_by_another_process(self):
+        """A write in another process makes the cached page stale."""
+        self.guest_client.get(INDEX_URL)
+        with self.assertNumQueries(0):
+            self.guest_client.get(INDEX_URL)
+        subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+             'shell', '-c',
+             'from posts.feed import invalidate_index; invalidate_index()'],
+            env={**os.environ, 'CACHE_URL': self.server.url},
+            check=True
+        )
+        with self.assertNumQueries(3):
+            self.guest_client.get(INDEX_URL)
+
+
+class PageCacheTests(TestCase):
+    """Guests get pages from the cache until a write changes them."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        cls.other = User.objects.create_user('other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author,
+                                       group=cls.group)
+        cls.urls = {
+            'author': reverse('posts:profile', args=['author']),
+            'other': reverse('posts:profile', args=['other']),
+            'group': reverse('posts:group_posts', args=['group']),
+            'post': reverse('posts:post', args=['author', cls.post.pk]),
+        }
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.other)
+
+    def setUp(self):
+        cache.clear()
+        for url in self.urls.values():
+            self.client.get(url)
+
+    def assertCached(self, *names):
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertEqual(not queries, name in names)
+
+    def test_served_from_cache(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls['post'])
+        self.assertContains(response, 'Первый пост')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=30', response['Cache-Control'])
+        revalidated = self.client.get(self.urls['post'],
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_signed_in_users_are_not_cached(self):
+        response = self.reader_client.get(self.urls['author'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(self.reader_client.get(self.urls['author']),
+                            'Подписаться')
+
+    def test_post_purges_its_pages(self):
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        # The post page shows the number of posts of its author.
+        self.assertCached('other')
+        self.assertContains(self.client.get(self.urls['author']),
+                            'Новый пост')
+
+    def test_comment_purges_its_pages(self):
+        Comment.objects.create(post=self.post, author=self.other,
+                               text='Комментарий')
+        self.assertCached('other')
+        self.assertContains(self.client.get(self.urls['post']),
+                            'Комментарий')
+
+    def test_follow_purges_profiles(self):
+        FollowAuthor.objects.create(user=self.other, author=self.author)
+        self.assertCached('group')
+
+
+class TwoTierIndexTests(TestCase):
+    """The feed is read from the local tier until its version changes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('test_admin')
+        Post.objects.create(text='Пост', author=cls.user)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_local_hits(self):
+        self.reader_client.get(INDEX_URL)
+        warm = self.reader_client.get(INDEX_URL)
+        self.assertGreater(warm.metrics.local_hits, 0)
+        self.assertEqual(warm.metrics.recomputes, 0)
+        self.assertIn('local;desc="', warm['Server-Timing'])
+        invalidate_index()
+        response = self.reader_client.get(INDEX_URL)
+        self.assertEqual(response.metrics.recomputes, 1)
+
+
+class IndexPageKeysTests(TestCase):
+    """Only pages the feed links to are cached, and deep ones by cursor."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('test_admin')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.user)
+            for number in range(settings.PAGINATOR_POSTS_PER_PAGE
+                                * (settings.PAGINATOR_NUMBERED_PAGES + 2))
+        )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(INDEX_URL, params)
+        reads = [query for query in queries.captured_queries
+                 if Post._meta.db_table in query['sql']]
+        return response, len(reads)
+
+    def test_linked_cursors_are_cached(self):
+        last_numbered, _ = self.get(page=settings.PAGINATOR_NUMBERED_PAGES)
+        cursor = last_numbered.context['page'].next_cursor
+        self.assertEqual(self.get(after=cursor)[0].metrics.recomputes, 1)
+        self.assertEqual(self.get(after=cursor)[1], 0)
+
+    def test_other_cursors_are_not_cached(self):
+        first_page = self.get()[0].context['page']
+        cursor = encode_cursor(first_page[0])
+        for attempt in range(2):
+            response, reads = self.get(after=cursor)
+            self.assertEqual(response.metrics.recomputes, 0)
+            self.assertGreater(reads, 0)
+        # A malformed cursor gives the cached first page.
+        self.assertEqual(self.get(after='мусор')[1], 0)
+
+    def test_deep_numbers_are_redirected(self):
+        page = settings.PAGINATOR_NUMBERED_PAGES + 1
+        cursor = self.get(
+            page=settings.PAGINATOR_NUMBERED_PAGES
+        )[0].context['page'].next_cursor
+        for url in (INDEX_URL, reverse('posts:profile', args=['test_admin'])):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url, {'page': page})
+                self.assertRedirects(response, f'{url}?after={cursor}')
+        # Short lists give their last page, as numbered pages always did.
+        other = User.objects.create_user('other')
+        Post.objects.create(text='Единственный пост', author=other)
+        response = self.reader_client.get(
+            reverse('posts:profile', args=['other']), {'page': page}
+        )
+        self.assertContains(response, 'Единственный пост')
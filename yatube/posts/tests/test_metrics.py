@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from yatube.metrics import collect
+
+from ..models import Comment, FollowAuthor, FollowGroup, Group, Post, User
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every view of QUERY_BUDGETS stays within its budget on a cold cache,
+    however many posts, comments and authors are on the page.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for number in range(3):
+            author = User.objects.create_user(f'author{number}')
+            FollowAuthor.objects.create(user=cls.reader, author=author)
+            for _ in range(4):
+                post = Post.objects.create(text='Пост о метриках',
+                                           author=author, group=cls.group)
+                for _ in range(2):
+                    Comment.objects.create(post=post, author=cls.reader,
+                                           text='Комментарий')
+        FollowGroup.objects.create(user=cls.reader, group=cls.group)
+        cls.post = post
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        author = self.post.author.username
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_posts': reverse('posts:group_posts',
+                                         args=[self.group.slug]),
+            'posts:profile': reverse('posts:profile', args=[author]),
+            'posts:post': reverse('posts:post', args=[author, self.post.pk]),
+            'posts:comments': reverse('posts:comments',
+                                      args=[author, self.post.pk]),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:search': reverse('posts:search') + '?q=метрик',
+        }
+
+    def test_views_within_budget(self):
+        urls = self.urls()
+        self.assertEqual(set(urls), set(settings.QUERY_BUDGETS))
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                metrics = self.reader_client.get(url).metrics
+                self.assertEqual(metrics.view_name, name)
+                self.assertLessEqual(
+                    metrics.queries, settings.QUERY_BUDGETS[name],
+                    f'{name}: {metrics.as_dict()}'
+                )
+                self.assertEqual(metrics.duplicates, 0)
+
+    def test_server_timing(self):
+        url = reverse('posts:index')
+        cold = self.reader_client.get(url)
+        warm = self.reader_client.get(url)
+        self.assertIn('db;dur=', cold['Server-Timing'])
+        self.assertGreater(cold.metrics.template_time, 0)
+        self.assertGreater(cold.metrics.cache_misses, 0)
+        self.assertGreater(warm.metrics.cache_hits, 0)
+        self.assertLess(warm.metrics.queries, cold.metrics.queries)
+
+    def test_collect(self):
+        with collect() as metrics:
+            list(Post.objects.all()[:1])
+            list(Post.objects.all()[:1])
+            cache.get('missing')
+        self.assertEqual(metrics.queries, 2)
+        self.assertEqual(metrics.duplicates, 1)
+        self.assertEqual(metrics.cache_misses, 1)
+        self.assertIn('2 queries, 1 duplicate', metrics.server_timing())
@@ -1,6 +1,12 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Comment, FollowAuthor, Group, Post, User
+from ..models import (Comment, FollowAuthor, FollowGroup, Group, Post, User,
+                      UserCounter)
 
 
 class GroupModelTest(TestCase):
@@ -102,3 +108,143 @@ class FollowModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     FollowAuthor._meta.get_field(field).verbose_name, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        FollowAuthor.objects.create(user=self.reader, author=self.author)
+        FollowGroup.objects.create(user=self.reader, group=self.group)
+        self.author.counters.refresh_from_db()
+        self.reader.counters.refresh_from_db()
+        self.group.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.author.counters.posts_count, 1)
+        self.assertEqual(self.author.counters.followers_count, 1)
+        self.assertEqual(self.reader.counters.following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.group.followers_count, 1)
+        self.assertEqual(post.comment_count, 1)
+        post.delete()
+        FollowAuthor.objects.all().delete()
+        self.author.counters.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.counters.posts_count, 0)
+        self.assertEqual(self.author.counters.followers_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_saves_keep_concurrent_counts(self):
+        """A post or group edited after a comment or a follow made
+        meanwhile keeps the count."""
+        Post.objects.create(text='Пост', author=self.author, group=self.group)
+        post = Post.objects.get()
+        group = Group.objects.get(pk=self.group.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        FollowGroup.objects.create(user=self.reader, group=self.group)
+        post.text = 'Исправленный пост'
+        post.save()
+        group.title = 'Новое название'
+        group.save()
+        post.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(group.title, 'Новое название')
+        self.assertEqual((group.posts_count, group.followers_count), (1, 1))
+
+    def test_copies_are_inserted(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=self.group)
+        group = Group.objects.get(pk=self.group.pk)
+        post.pk = None
+        post.save()
+        group.pk = None
+        group.slug = 'copy'
+        group.save()
+        self.assertEqual(Post.objects.filter(text='Пост').count(), 2)
+        self.assertEqual(Group.objects.get(slug='copy').title,
+                         self.group.title)
+
+    def test_recount_command(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Post.objects.update(comment_count=0)
+        Group.objects.update(posts_count=0)
+        UserCounter.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).posts_count,
+            1
+        )
+
+
+class PostTextTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user('author')
+
+    def test_text_is_sanitized(self):
+        post = Post.objects.create(
+            author=self.author,
+            text='<p onclick="steal()">Привет,<br>мир</p>\n'
+                 '<script>alert(1)</script>'
+                 '<a href="javascript:alert(1)">ссылка</a> '
+                 '<a href="https://example.com">сайт</a> <blink>да</blink>'
+        )
+        self.assertEqual(
+            post.text_html,
+            '<p>Привет,<br>мир</p><br><a rel="nofollow">ссылка</a> '
+            '<a href="https://example.com" rel="nofollow">сайт</a> да'
+        )
+        self.assertEqual(post.excerpt, 'Привет, мир ссылка сайт да')
+        self.assertFalse(post.is_excerpted)
+
+    def test_excerpt(self):
+        with self.settings(POST_EXCERPT_LENGTH=20):
+            post = Post.objects.create(
+                author=self.author,
+                text='<p>Очень длинный текст поста</p>'
+            )
+            self.assertEqual(post.excerpt, 'Очень длинный текст…')
+            self.assertTrue(post.is_excerpted)
+            post.text = 'Короткий'
+            post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Короткий')
+        self.assertFalse(post.is_excerpted)
+
+    def test_render_command(self):
+        post = Post.objects.create(author=self.author, text='<b>Жирный</b>')
+        Post.objects.update(text_html='', excerpt='')
+        call_command('render_post_text', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<b>Жирный</b>')
+        self.assertEqual(post.excerpt, 'Жирный')
+
+    def test_render_command_refreshes_pages(self):
+        post = Post.objects.create(author=self.author, text='<b>Жирный</b>')
+        # As left by an older allowlist, without a new `updated`.
+        Post.objects.update(text_html='Старый HTML')
+        url = reverse('posts:post', args=[self.author.username, post.pk])
+        cache.clear()
+        self.assertContains(self.client.get(url), 'Старый HTML')
+        call_command('render_post_text', all=True, stdout=StringIO())
+        updated = post.updated
+        post.refresh_from_db()
+        self.assertGreater(post.updated, updated)
+        self.assertContains(self.client.get(url), '<b>Жирный</b>')
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from yatube.routers import replica_databases
+
+from ..models import Post, User
+
+
+class ReplicaTests(TransactionTestCase):
+    """
+    Reads of the listing views, here the profile of the author, come
+    from a replica synced by `sync_replicas`, until the client writes
+    something.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases.update(replica_databases(
+            connections.databases['default'],
+            [os.path.join(directory.name, 'replica.sqlite3')]
+        ))
+        self.addCleanup(connections.databases.pop, 'replica1')
+        self.addCleanup(self.close_replica)
+        replicas = override_settings(REPLICA_DATABASES=['replica1'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        cache.clear()
+
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader')
+        Post.objects.create(text='Пост в реплике', author=self.author)
+        call_command('sync_replicas', stdout=StringIO())
+        Post.objects.create(text='Пост после копирования',
+                            author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def close_replica(self):
+        if hasattr(connections._connections, 'replica1'):
+            connections['replica1'].close()
+            del connections['replica1']
+
+    def assertFeed(self, client, *texts, view='posts:profile'):
+        cache.clear()
+        args = [self.author.username] if view == 'posts:profile' else []
+        response = client.get(reverse(view, args=args))
+        self.assertEqual(
+            [post.text for post in response.context['page']], list(texts)
+        )
+        return response
+
+    def test_reads_from_replica(self):
+        self.assertFeed(self.client, 'Пост в реплике')
+        # The session created after the copy is read from the primary.
+        response = self.assertFeed(self.reader_client, 'Пост в реплике')
+        self.assertEqual(response.context['user'], self.reader)
+
+    def test_main_feed_reads_from_primary(self):
+        """Pages of the main feed are cached for everybody."""
+        self.assertFeed(self.client, 'Пост после копирования',
+                        'Пост в реплике', view='posts:index')
+
+    def test_other_views_read_from_primary(self):
+        response = self.reader_client.get(reverse('posts:new_post'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+
+    def test_writer_reads_own_writes(self):
+        response = self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+        self.assertFeed(self.reader_client, 'Пост после копирования',
+                        'Пост в реплике')
+        # The guest still reads from the replica.
+        self.assertFeed(self.client, 'Пост в реплике')
+
+    def test_sync(self):
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertFeed(self.client, 'Пост после копирования',
+                        'Пост в реплике')
@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Group, Post, SearchEntry, User
+
+SEARCH_URL = reverse('posts:search')
+
+
+class SearchBackendTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('test_admin')
+        cls.group = Group.objects.create(
+            title='Любители собак',
+            slug='dogs',
+            description='Всё о собаках и щенках'
+        )
+        cls.text_post = Post.objects.create(
+            text='<p>Моя <strong>собака</strong> любит ёлку</p>',
+            author=cls.user
+        )
+        cls.comment_post = Post.objects.create(
+            text='<p>Фотография кота</p>',
+            author=cls.user
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.comment_post, author=cls.user, text='А у меня собака'
+        )
+        Post.objects.create(text='Ни о чём', author=cls.user)
+
+    def search(self, backend, query, kind=search.POST):
+        return [
+            item.pk for item in
+            search.SearchResults(query, kind=kind, backend=backend)[:10]
+        ]
+
+    def check_ranking_and_prefixes(self, backend):
+        search.rebuild(backend)
+        self.assertEqual(self.search(backend, 'Собак'),
+                         [self.text_post.pk, self.comment_post.pk])
+        self.assertEqual(self.search(backend, 'собака елк'),
+                         [self.text_post.pk])
+        self.assertEqual(self.search(backend, 'strong'), [])
+        self.assertEqual(self.search(backend, 'щенк', search.GROUP),
+                         [self.group.pk])
+        self.assertEqual(
+            search.SearchResults('собака', backend=backend).count(), 2
+        )
+
+    def check_incremental_updates(self, name):
+        backend = search._backend(name)
+        search.rebuild(backend)
+        with self.settings(SEARCH_BACKEND=name):
+            post = Post.objects.create(text='Новый попугай', author=self.user)
+            self.assertEqual(self.search(backend, 'попугай'), [post.pk])
+            comment = Comment.objects.create(
+                post=self.text_post, author=self.user, text='И попугай тоже'
+            )
+            self.assertEqual(self.search(backend, 'попугай'),
+                             [post.pk, self.text_post.pk])
+            self.assertEqual(self.search(backend, 'попугай', search.COMMENT),
+                             [comment.pk])
+            post.delete()
+            self.assertEqual(self.search(backend, 'попугай'),
+                             [self.text_post.pk])
+            comment.delete()
+            self.assertEqual(self.search(backend, 'попугай'), [])
+
+    def test_fts5_backend(self):
+        self.check_ranking_and_prefixes(search.Fts5Backend())
+        self.check_incremental_updates('fts5')
+
+    def test_index_backend(self):
+        self.check_ranking_and_prefixes(search.IndexBackend())
+        self.check_incremental_updates('index')
+
+    def test_comment_is_its_own_document(self):
+        backend = search.IndexBackend()
+        search.rebuild(backend)
+        with self.settings(SEARCH_BACKEND='index'):
+            comment = Comment.objects.create(
+                post=self.comment_post, author=self.user, text='Второй'
+            )
+        self.assertEqual(
+            set(SearchEntry.objects.filter(
+                post_id=self.comment_post.pk
+            ).values_list('kind', 'object_id')),
+            {(search.POST, self.comment_post.pk),
+             (search.COMMENT, self.comment.pk), (search.COMMENT, comment.pk)}
+        )
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('test_admin')
+        for number in range(12):
+            Post.objects.create(text=f'Пост про сад номер {number}',
+                                author=cls.user)
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_page(self):
+        response = self.guest_client.get(SEARCH_URL, {'q': 'сад'})
+        page = response.context['page']
+        self.assertEqual(page.paginator.count, 12)
+        self.assertEqual(len(page), 10)
+        self.assertContains(response, '?q=%D1%81%D0%B0%D0%B4&amp;page=2')
+        response = self.guest_client.get(
+            SEARCH_URL, {'q': 'сад', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_empty_query(self):
+        response = self.guest_client.get(SEARCH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 0)
@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import seeding
+from ..models import (Comment, FollowAuthor, Group, Post, TimelineEntry, User,
+                      UserCounter)
+
+VOLUMES = {'users': 40, 'groups': 4, 'posts': 300, 'comments': 500,
+           'follows': 6}
+
+
+class SeedingTests(TestCase):
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'author', 'group', 'text', 'pub_date'
+            )),
+            list(Comment.objects.order_by('pk').values_list(
+                'post', 'author', 'created'
+            )),
+            list(FollowAuthor.objects.order_by('pk').values_list(
+                'user', 'author'
+            )),
+        )
+
+    def test_volumes_and_denormalized_data(self):
+        call_command('seed_yatube', stdout=StringIO(),
+                     **{name.replace('_', '-'): value
+                        for name, value in VOLUMES.items()})
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 500)
+        post = Post.objects.order_by('comment_count').last()
+        self.assertEqual(post.comment_count, post.comments.count())
+        self.assertEqual(post.text_html, post.text)
+        followers = sorted(
+            UserCounter.objects.values_list('followers_count', flat=True)
+        )
+        # The top tenth of authors has far more than a tenth of followers.
+        self.assertGreater(sum(followers[-4:]), sum(followers) / 4)
+        follow = FollowAuthor.objects.first()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=follow.user, post__author=follow.author
+        ).exists())
+
+    def test_same_seed_same_rows(self):
+        seeding.seed(**VOLUMES)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seeding.seed(**VOLUMES)
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seeding.seed(seed=1, **VOLUMES)
+        self.assertNotEqual(self.snapshot(), first)
@@ -1,13 +1,22 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import FollowAuthor, Group, Post, User
+from .. import follows, thumbnails
+from ..models import (Comment, FollowAuthor, FollowGroup, Group, Post,
+                      PostThumbnail, ThumbnailJob, User)
+from ..paginators import encode_cursor
 
 TEST_DIR = 'test_data'
 SMALL_GIF = (
@@ -101,7 +110,7 @@ class TaskPagesTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
-        cache.delete('index_page')
+        cache.clear()
 
     def test_correct_post_in_context(self):
         list_urls_post_in_context = [
@@ -177,7 +186,7 @@ class PaginatorViewsTest(TestCase):
             batch_size=10)
 
     def setUp(self):
-        cache.delete('index_page')
+        cache.clear()
 
     def test_paginator(self):
         url_to_posts_count = [INDEX_URL, GROUP_URL, PROFILE_URL]
@@ -195,6 +204,143 @@ class PaginatorViewsTest(TestCase):
                      - settings.PAGINATOR_POSTS_PER_PAGE)
                 )
 
+    def test_cursor_paginator(self):
+        first_page = self.guest_client.get(INDEX_URL).context['page']
+        cursor = encode_cursor(first_page[len(first_page) - 1])
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url, {'after': cursor})
+                page = response.context['page']
+                self.assertEqual(len(page), 1)
+                self.assertFalse(page.has_next())
+                self.assertTrue(page.has_previous())
+                self.assertFalse(
+                    any('OFFSET' in query['sql'] for query in queries)
+                )
+                previous_page = self.guest_client.get(
+                    url,
+                    {'before': page.previous_cursor}
+                ).context['page']
+                self.assertEqual(
+                    [post.id for post in previous_page],
+                    [post.id for post in first_page]
+                )
+
+
+class FeedQueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(USERNAME)
+        cls.follower = User.objects.create_user(USERNAME_FOLLOW_TEST1)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=GROUP_SLUG,
+            description='Тестовое описание группы'
+        )
+        FollowAuthor.objects.create(user=cls.follower, author=cls.user)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                text=f'Пост номер {number}',
+                author=self.user,
+                group=self.group
+            )
+            for comment_number in range(settings.FEED_COMMENTS_PER_POST + 1):
+                Comment.objects.create(
+                    post=post,
+                    author=self.follower,
+                    text=f'Комментарий {comment_number}'
+                )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        urls = [INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_URL]
+        self.create_posts(1)
+        one_post_queries = {url: self.count_queries(url) for url in urls}
+        self.create_posts(settings.PAGINATOR_POSTS_PER_PAGE - 1)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url),
+                    one_post_queries[url]
+                )
+
+    def test_feed_shows_latest_comments_only(self):
+        self.create_posts(1)
+        post = self.authorized_client.get(INDEX_URL).context['page'][0]
+        self.assertEqual(
+            post.comment_count,
+            settings.FEED_COMMENTS_PER_POST + 1
+        )
+        self.assertEqual(
+            [comment.text for comment in post.recent_comments],
+            [f'Комментарий {number + 1}'
+             for number in range(settings.FEED_COMMENTS_PER_POST)]
+        )
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(USERNAME)
+        cls.post = Post.objects.create(text='Обсуждаемый пост',
+                                       author=cls.user)
+        for number in range(5):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {number}')
+        cls.post_url = reverse('posts:post', args=[USERNAME, cls.post.pk])
+        cls.comments_url = reverse('posts:comments',
+                                   args=[USERNAME, cls.post.pk])
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_post_page_shows_first_comments(self):
+        response = self.client.get(self.post_url)
+        self.assertEqual(self.texts(response),
+                         ['Комментарий 0', 'Комментарий 1'])
+        cursor = response.context['comments'].next_cursor
+        self.assertContains(response, f'{self.comments_url}?after={cursor}')
+
+    def test_fragment_loads_next_comments(self):
+        texts = []
+        cursor = None
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                response = self.client.get(self.comments_url,
+                                           {'after': cursor} if cursor
+                                           else {})
+                self.assertTemplateUsed(response,
+                                        'includes/comment_list.html')
+                texts += self.texts(response)
+                cursor = response.context['comments'].next_cursor
+        self.assertEqual(texts, [f'Комментарий {number}'
+                                 for number in range(5)])
+        self.assertIsNone(cursor)
+        self.assertEqual(len(queries), 3 * 2)
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_fragment_of_missing_post(self):
+        response = self.client.get(
+            reverse('posts:comments', args=['nobody', self.post.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
 
 class TaskCacheTests(TestCase):
     @classmethod
@@ -215,16 +361,156 @@ class TaskCacheTests(TestCase):
         )
 
     def setUp(self):
-        cache.delete('index_page')
+        cache.clear()
 
     def test_cache(self):
         response = self.guest_client.get(INDEX_URL)
-        Post.objects.create(text='text', author=self.user)
+        with self.assertNumQueries(0):
+            cached_response = self.guest_client.get(INDEX_URL)
+        self.assertEqual(cached_response.content, response.content)
+        Post.objects.create(text='Новый пост после кеша', author=self.user)
         response2 = self.guest_client.get(INDEX_URL)
-        self.assertEqual(response2.content, response.content)
-        cache.delete('index_page')
-        response3 = self.guest_client.get(INDEX_URL)
-        self.assertTrue(response3.content != response2.content)
+        self.assertNotEqual(response2.content, response.content)
+        self.assertContains(response2, 'Новый пост после кеша')
+
+    def test_cache_invalidated_by_comment(self):
+        self.guest_client.get(INDEX_URL)
+        Comment.objects.create(
+            post=self.post,
+            author=self.user,
+            text='Свежий комментарий'
+        )
+        self.assertContains(
+            self.guest_client.get(INDEX_URL),
+            'Свежий комментарий'
+        )
+
+    def test_post_card_cache(self):
+        profile_url = reverse('posts:profile', args=[self.user.username])
+        self.guest_client.get(profile_url)
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Без новой версии', text_html='Без новой версии'
+        )
+        self.assertNotContains(
+            self.guest_client.get(profile_url),
+            'Без новой версии'
+        )
+        Comment.objects.create(
+            post=self.post,
+            author=self.user,
+            text='Комментарий обновляет карточку'
+        )
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Без новой версии')
+        self.assertContains(response, 'Комментарий обновляет карточку')
+
+    def test_group_rename_refreshes_cards(self):
+        group = Group.objects.create(title='Старое название', slug='renamed')
+        Post.objects.create(text='Пост в группе', author=self.user,
+                            group=group)
+        self.assertContains(self.guest_client.get(INDEX_URL),
+                            '#Старое название')
+        group.title = 'Новое название'
+        group.save()
+        response = self.guest_client.get(INDEX_URL)
+        self.assertContains(response, '#Новое название')
+        self.assertNotContains(response, '#Старое название')
+
+    def test_post_card_cache_varies_on_viewer(self):
+        edit_url = reverse(
+            'posts:post_edit',
+            args=[self.user.username, self.post.id]
+        )
+        author_client = Client()
+        author_client.force_login(self.user)
+        self.assertContains(author_client.get(INDEX_URL), edit_url)
+        self.assertNotContains(self.guest_client.get(INDEX_URL), edit_url)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(USERNAME)
+        cls.reader = User.objects.create_user(USERNAME_FOLLOW_TEST1)
+        cls.group = Group.objects.create(title='Группа', slug=GROUP_SLUG)
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        cls.post_url = reverse('posts:post',
+                               args=[USERNAME, cls.post.pk])
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_not_modified(self):
+        guest = Client()
+        for url, queries in ((INDEX_URL, 0), (GROUP_URL, 1),
+                             (PROFILE_URL, 1), (self.post_url, 1)):
+            with self.subTest(url=url):
+                etag = guest.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_make_pages_modified(self):
+        etags = {url: Client().get(url)['ETag']
+                 for url in (INDEX_URL, GROUP_URL, PROFILE_URL,
+                             self.post_url)}
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Новый комментарий')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    Client().get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200
+                )
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_etag_includes_pagination(self):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.author, group=self.group)
+            for number in range(settings.PAGINATOR_POSTS_PER_PAGE)
+        )
+        etags = {url: Client().get(url)['ETag']
+                 for url in (GROUP_URL, PROFILE_URL)}
+        # The first page keeps its posts and loses its link to the second.
+        self.post.delete()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    Client().get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200
+                )
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_group_rename_makes_pages_modified(self):
+        etags = {url: Client().get(url)['ETag']
+                 for url in (GROUP_URL, PROFILE_URL, self.post_url)}
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    Client().get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200
+                )
+
+    def test_etag_includes_viewer(self):
+        self.assertNotEqual(Client().get(PROFILE_URL)['ETag'],
+                            self.reader_client.get(PROFILE_URL)['ETag'])
+        etag = self.reader_client.get(PROFILE_URL)['ETag']
+        FollowAuthor.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(PROFILE_URL,
+                                          HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.revalidate(self.reader_client, PROFILE_URL).status_code,
+            304
+        )
 
 
 class TaskFollowTests(TestCase):
@@ -291,3 +577,237 @@ class TaskFollowTests(TestCase):
                 author=self.user3
             ).exists()
         )
+
+    def test_follow_feed_timeline(self):
+        group = Group.objects.create(title='Группа ленты', slug='timeline')
+        FollowGroup.objects.create(user=self.user, group=group)
+        self.authorized_client.get(PROFILE_FOLLOW_URL)
+        new_post = Post.objects.create(
+            text='Пост автора в группе',
+            author=self.user2,
+            group=group
+        )
+        page = self.authorized_client.get(FOLLOW_URL).context['page']
+        self.assertEqual(
+            [post.id for post in page],
+            [new_post.id, self.post.id]
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[USERNAME_FOLLOW_TEST1])
+        )
+        page = self.authorized_client.get(FOLLOW_URL).context['page']
+        self.assertEqual([post.id for post in page], [new_post.id])
+
+
+@override_settings(MEDIA_ROOT=(TEST_DIR + '/media'))
+class BulkFollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('reader')
+        cls.authors = [User.objects.create_user(f'author{number}')
+                       for number in range(6)]
+        cls.groups = [
+            Group.objects.create(title=f'Группа {number}',
+                                 slug=f'group{number}')
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author.username}',
+                                author=author)
+        FollowAuthor.objects.create(user=cls.reader, author=cls.authors[0])
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def import_follows(self, **data):
+        return self.reader_client.post(reverse('posts:follow_import'), data)
+
+    def test_import(self):
+        response = self.import_follows(
+            authors='author0, author1\n@author2 reader nobody',
+            groups='group0 #group1'
+        )
+        result = response.context['result']
+        self.assertEqual(result.authors, 2)
+        self.assertEqual(result.groups, 2)
+        self.assertEqual(result.missing, ['nobody'])
+        self.assertEqual(
+            set(self.reader.follower.values_list('author__username',
+                                                 flat=True)),
+            {'author0', 'author1', 'author2'}
+        )
+        self.reader.counters.refresh_from_db()
+        self.assertEqual(self.reader.counters.following_count, 3)
+        self.groups[0].refresh_from_db()
+        self.assertEqual(self.groups[0].followers_count, 1)
+        feed = self.reader_client.get(FOLLOW_URL).context['page']
+        self.assertEqual({post.author.username for post in feed},
+                         {'author0', 'author1', 'author2'})
+
+    def test_import_queries_do_not_depend_on_size(self):
+        with CaptureQueriesContext(connection) as few:
+            self.import_follows(authors='author1', groups='group0')
+        with CaptureQueriesContext(connection) as many:
+            self.import_follows(authors='author2 author3 author4 author5',
+                                groups='group1 group2')
+        self.assertEqual(len(many), len(few))
+
+    def test_export_and_import_back(self):
+        self.import_follows(authors='author1', groups='group2')
+        for export_format in ('csv', 'json'):
+            with self.subTest(format=export_format):
+                response = self.reader_client.get(
+                    reverse('posts:follow_export'),
+                    {'format': export_format}
+                )
+                content = b''.join(response.streaming_content)
+                self.assertEqual(follows.parse(content.decode()),
+                                 (['author0', 'author1'], ['group2']))
+                upload = SimpleUploadedFile(f'follows.{export_format}',
+                                            content)
+                result = self.import_follows(
+                    file=upload, unfollow=True
+                ).context['result']
+                self.assertEqual((result.authors, result.groups), (2, 1))
+                self.assertFalse(self.reader.follower.exists())
+                upload.seek(0)
+                self.import_follows(file=upload)
+                self.assertEqual(self.reader.follower.count(), 2)
+
+    def test_import_errors(self):
+        response = self.import_follows(authors='')
+        self.assertFormError(response, 'form', None,
+                             'Укажите авторов или группы.')
+        response = self.import_follows(
+            file=SimpleUploadedFile('follows.csv', b'a,b,c')
+        )
+        self.assertIsNone(response.context['result'])
+        self.assertFalse(response.context['form'].is_valid())
+        for content in (b'{"authors": 1}', b'{"groups": null}',
+                        b'{"authors": "author1"}'):
+            with self.subTest(content=content):
+                response = self.import_follows(
+                    file=SimpleUploadedFile('follows.json', content)
+                )
+                self.assertFormError(
+                    response, 'form', None,
+                    'Файл не похож на выгрузку подписок в CSV или JSON.'
+                )
+        self.assertEqual(self.reader.follower.count(), 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('import_follows', 'reader', authors=['author3'],
+                     groups=['group1'], stdout=out, stderr=StringIO())
+        self.assertIn('авторов — 1, групп — 1', out.getvalue())
+        self.assertTrue(self.reader.group_follower.filter(
+            group__slug='group1'
+        ).exists())
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create_user(USERNAME)
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif')
+        )
+
+    def test_placeholder_until_job_is_done(self):
+        job = ThumbnailJob.objects.get(post=self.post)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        self.assertContains(self.guest_client.get(INDEX_URL),
+                            'Изображение обрабатывается')
+        self.assertEqual(thumbnails.process_pending(), 1)
+        thumbnail = PostThumbnail.objects.get(post=self.post)
+        self.assertEqual(
+            (thumbnail.geometry, thumbnail.width, thumbnail.height),
+            ('960x339', 960, 339)
+        )
+        response = self.guest_client.get(INDEX_URL)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, thumbnail.url)
+
+    def test_new_image_replaces_thumbnails(self):
+        thumbnails.process_pending()
+        self.post.image = None
+        self.post.save()
+        self.assertFalse(self.post.thumbnails.exists())
+        self.assertEqual(thumbnails.process_pending(), 0)
+        self.assertEqual(thumbnails.queue_missing(), 0)
+
+    def test_page_reads_thumbnails_at_once(self):
+        for number in range(3):
+            Post.objects.create(
+                text=f'Еще пост с картинкой {number}',
+                author=self.user,
+                image=SimpleUploadedFile(f'thumb{number}.gif', SMALL_GIF,
+                                         'image/gif')
+            )
+        thumbnails.process_pending()
+        for attempt in ('cold', 'warm'):
+            with self.subTest(cache=attempt):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(PROFILE_URL)
+                thumbnail_queries = [
+                    query for query in queries.captured_queries
+                    if PostThumbnail._meta.db_table in query['sql']
+                ]
+                self.assertEqual(len(thumbnail_queries),
+                                 1 if attempt == 'cold' else 0)
+                self.assertEqual(
+                    response.content.decode().count('width="960"'), 4
+                )
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailFilesTests(TransactionTestCase):
+    """Files of replaced and deleted images do not stay in the storage."""
+
+    def setUp(self):
+        media = self.settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR)
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, True)
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create_user(USERNAME),
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif')
+        )
+        thumbnails.process_pending()
+        self.files = [self.post.image.name] + list(
+            self.post.thumbnails.values_list('name', flat=True)
+        )
+
+    def assertDeleted(self):
+        for name in self.files:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_image(self):
+        self.assertTrue(all(map(default_storage.exists, self.files)))
+        self.post.image = SimpleUploadedFile('other.gif', SMALL_GIF,
+                                             'image/gif')
+        self.post.save()
+        self.assertDeleted()
+        self.assertTrue(default_storage.exists(self.post.image.name))
+
+    def test_deleted_post(self):
+        self.post.delete()
+        self.assertDeleted()
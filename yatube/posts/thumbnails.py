@@ -0,0 +1,180 @@
+"""Thumbnails of post images built ahead of time.
+
+Saving a post with a new image queues a `ThumbnailJob` (see
+`signals.py`). Once the transaction is committed the job is handed to a
+thread pool of the web process, `THUMBNAIL_WORKERS` threads wide; jobs
+left behind by a restart or a failure are run by
+`manage.py process_thumbnails`. Every geometry of `POST_THUMBNAILS` is
+stored as a `PostThumbnail`, which is all that templates read: they show
+a placeholder until the job is done and never resize an image inside a
+request.
+
+A replaced or deleted image is removed from the storage with every
+thumbnail sorl has made of it and their sorl key-value entries, once the
+transaction is committed, see `delete_image()`.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import delete, get_thumbnail
+
+from . import page_cache
+from .feed import invalidate_index
+from .models import Post, PostThumbnail, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def _delete_on_commit(description, function, *args):
+    def run():
+        try:
+            function(*args)
+        except Exception:
+            logger.exception('Deleting %s failed', description)
+    transaction.on_commit(run)
+
+
+def delete_image(name):
+    """Deletes an image no post shows any more, with its thumbnails."""
+    _delete_on_commit(f'image {name}', delete, name)
+
+
+def delete_thumbnail(name):
+    """Deletes the file of a `PostThumbnail`."""
+    _delete_on_commit(f'thumbnail {name}', default_storage.delete, name)
+
+
+def schedule(post):
+    """
+    Drops the thumbnails of the previous image of `post` and queues
+    a job for the current one.
+    """
+    post.thumbnails.all().delete()
+    post.thumbnail_jobs.filter(status=ThumbnailJob.PENDING).delete()
+    if not post.image:
+        return None
+    job = ThumbnailJob.objects.create(post=post, image=post.image.name)
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_in_worker, job.pk)
+        )
+    return job
+
+
+def _run_in_worker(job_id):
+    try:
+        run(job_id)
+    finally:
+        # Worker threads have their own connections; do not leak them.
+        connections.close_all()
+
+
+def run(job_id):
+    """
+    Builds the thumbnails of a pending job. Returns False when the job
+    was taken by another worker, has gone or failed.
+    """
+    claimed = ThumbnailJob.objects.filter(
+        pk=job_id, status=ThumbnailJob.PENDING
+    ).update(status=ThumbnailJob.RUNNING, started=timezone.now(),
+             attempts=F('attempts') + 1)
+    job = claimed and ThumbnailJob.objects.select_related('post').filter(
+        pk=job_id
+    ).first()
+    if not job:
+        return False
+    try:
+        built = [
+            (geometry, get_thumbnail(job.post.image, geometry, **options))
+            for geometry, options in settings.POST_THUMBNAILS.items()
+        ]
+    except Exception as error:
+        logger.exception('Thumbnails of post %s failed', job.post_id)
+        ThumbnailJob.objects.filter(pk=job_id).update(
+            status=ThumbnailJob.FAILED, error=str(error),
+            finished=timezone.now()
+        )
+        return False
+    with transaction.atomic():
+        # Bumping `updated` refreshes the cached post card. A post whose
+        # image was replaced meanwhile waits for the job of the new one.
+        current = Post.objects.filter(
+            pk=job.post_id, image=job.image
+        ).update(updated=timezone.now())
+        if current:
+            for geometry, thumbnail in built:
+                PostThumbnail.objects.update_or_create(
+                    post_id=job.post_id, geometry=geometry,
+                    defaults={'name': thumbnail.name,
+                              'width': thumbnail.width,
+                              'height': thumbnail.height}
+                )
+        else:
+            # Built after the image was replaced or the post deleted.
+            delete_image(job.image)
+        ThumbnailJob.objects.filter(pk=job_id).update(
+            status=ThumbnailJob.DONE, error='', finished=timezone.now()
+        )
+    invalidate_index()
+    page_cache.purge(*page_cache.post_tags(job.post_id))
+    return True
+
+
+def requeue(failed=False):
+    """
+    Queues again the jobs stuck in a killed process and, optionally,
+    the failed ones. Returns the number of requeued jobs.
+    """
+    stuck = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.RUNNING,
+        started__lt=timezone.now() - timedelta(
+            seconds=settings.THUMBNAIL_JOB_TIMEOUT
+        )
+    )
+    requeued = stuck.update(status=ThumbnailJob.PENDING)
+    if failed:
+        requeued += ThumbnailJob.objects.filter(
+            status=ThumbnailJob.FAILED
+        ).update(status=ThumbnailJob.PENDING)
+    return requeued
+
+
+def queue_missing():
+    """Queues jobs for post images that have neither thumbnails nor jobs."""
+    posts = Post.objects.exclude(image='').exclude(image=None).filter(
+        thumbnails=None, thumbnail_jobs=None
+    )
+    jobs = ThumbnailJob.objects.bulk_create(
+        ThumbnailJob(post_id=pk, image=image)
+        for pk, image in posts.values_list('pk', 'image').iterator()
+    )
+    return len(jobs)
+
+
+def process_pending(limit=None):
+    """Runs pending jobs in this thread. Returns the number of built ones."""
+    pending = ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING
+    ).values_list('pk', flat=True)
+    return sum(run(job_id) for job_id in list(pending[:limit]))
@@ -0,0 +1,112 @@
+"""Materialized follow feeds (fan-out on write).
+
+Every user has a list of `TimelineEntry` rows: one per post of the
+authors and groups they follow. The list is filled when a post is
+published and when a subscription is made, and trimmed when a
+subscription is removed, so `follow_index` reads a single indexed range
+instead of joining the follow tables on every request.
+"""
+from django.conf import settings
+from django.db.models import F
+
+from .models import FollowAuthor, FollowGroup, Post, TimelineEntry
+
+# Matches the (user, -pub_date, -post) index of TimelineEntry, so a page of
+# the feed is a single index range without sorting.
+ORDERING = ('-timeline_pub_date', '-timeline_post')
+
+
+def get_posts(user):
+    """Posts of the follow feed of `user`, ordered by `ORDERING`."""
+    return Post.objects.filter(timeline_entries__user=user).annotate(
+        timeline_pub_date=F('timeline_entries__pub_date'),
+        timeline_post=F('timeline_entries__post'),
+    ).order_by(*ORDERING)
+
+
+def _subscribers(post):
+    subscribers = set(
+        FollowAuthor.objects.filter(author=post.author_id)
+        .values_list('user', flat=True)
+    )
+    if post.group_id:
+        subscribers.update(
+            FollowGroup.objects.filter(group=post.group_id)
+            .values_list('user', flat=True)
+        )
+    return subscribers
+
+
+def _add(user_id, posts):
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.order_by(
+                '-pub_date', '-id'
+            ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL_SIZE]
+        ),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """
+    Adds `post` to the timelines of the followers of its author and group
+    and removes it from timelines that no longer qualify, which happens
+    when an edit moves the post to another group.
+    """
+    subscribers = _subscribers(post)
+    TimelineEntry.objects.filter(post=post).exclude(
+        user__in=subscribers
+    ).delete()
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in subscribers
+        ),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+def follow_author(user_id, author_id):
+    """Backfills the latest posts of a newly followed author."""
+    follow_authors(user_id, [author_id])
+
+
+def follow_group(user_id, group_id):
+    """Backfills the latest posts of a newly followed group."""
+    follow_groups(user_id, [group_id])
+
+
+def follow_authors(user_id, author_ids):
+    """Backfills the latest posts of several authors with one query."""
+    if author_ids:
+        _add(user_id, Post.objects.filter(author__in=author_ids))
+
+
+def follow_groups(user_id, group_ids):
+    """Backfills the latest posts of several groups with one query."""
+    if group_ids:
+        _add(user_id, Post.objects.filter(group__in=group_ids))
+
+
+def unfollow_author(user_id, author_id):
+    """Removes the author's posts, except ones still followed by group."""
+    TimelineEntry.objects.filter(
+        user=user_id,
+        post__author=author_id
+    ).exclude(
+        post__group__group_following__user=user_id
+    ).delete()
+
+
+def unfollow_group(user_id, group_id):
+    """Removes the group's posts, except ones still followed by author."""
+    TimelineEntry.objects.filter(
+        user=user_id,
+        post__group=group_id
+    ).exclude(
+        post__author__following__user=user_id
+    ).delete()
@@ -32,6 +32,15 @@ urlpatterns = [
     path('follow/',
          views.follow_index,
          name='follow_index'),
+    path('follow/import/',
+         views.follow_import,
+         name='follow_import'),
+    path('follow/export/',
+         views.follow_export,
+         name='follow_export'),
+    path('search/',
+         views.search,
+         name='search'),
     path('<str:username>/',
          views.profile,
          name='profile'),
@@ -44,6 +53,9 @@ urlpatterns = [
     path('<str:username>/<int:post_id>/',
          views.post_view,
          name='post'),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments,
+         name='comments'),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'),
@@ -2,13 +2,19 @@
 from autoslug.settings import slugify
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_GET
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_GET
 
-from .forms import CommentForm, PostForm, GroupForm
+from . import conditional, follows, timeline
+from .feed import attach_thumbnails, get_feed_queryset, get_index_page
+from .forms import CommentForm, FollowImportForm, PostForm, GroupForm
 from .models import FollowAuthor, Group, Post, User, FollowGroup
+from .paginators import (COMMENTS_ORDERING, CursorPaginator,
+                         NumberedPaginator, paginate)
+from .search import GROUP, SearchResults
 
 
 def page_not_found(request, exception):
@@ -25,14 +31,9 @@ def server_error(request):
 
 
 @require_GET
+@condition(etag_func=conditional.index_etag)
 def index(request):
-    post_list = cache.get('index_page')
-    if post_list is None:
-        post_list = Post.objects.all()
-        cache.set('index_page', post_list, timeout=20)
-    paginator = Paginator(post_list, settings.PAGINATOR_POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = get_index_page(request)
     return render(request, 'posts/index.html', {'page': page})
 
 
@@ -44,21 +45,22 @@ def all_groups(request):
     return render(request, 'posts/groups.html', {'page': page})
 
 
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.group_posts.all()
-    paginator = Paginator(posts_list, settings.PAGINATOR_POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts_list = get_feed_queryset(group.group_posts.all())
+    page = attach_thumbnails(paginate(request, posts_list))
     return render(request, 'posts/group.html', {'group': group, 'page': page})
 
 
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts_list = author.posts.all()
-    paginator = Paginator(posts_list, settings.PAGINATOR_POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
+    posts_list = get_feed_queryset(author.posts.all())
+    page = attach_thumbnails(paginate(request, posts_list))
     following = (
             request.user.is_authenticated
             and author != request.user
@@ -74,8 +76,14 @@ def profile(request, username):
     })
 
 
+@condition(etag_func=conditional.post_etag)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        get_feed_queryset().select_related('author__counters'),
+        author__username=username,
+        id=post_id
+    )
+    attach_thumbnails([post])
     form = CommentForm(request.POST or None)
     following = (
             request.user.is_authenticated
@@ -88,11 +96,35 @@ def post_view(request, username, post_id):
     return render(request, 'posts/post.html', {
         'author': post.author,
         'post': post,
+        'comments': get_comments_page(request, post.comments.all()),
         'form': form,
         'following': following
     })
 
 
+def get_comments_page(request, comments):
+    """The page of `comments` following the `?after=` cursor."""
+    paginator = CursorPaginator(comments.select_related('author'),
+                                settings.COMMENTS_PER_PAGE,
+                                ordering=COMMENTS_ORDERING)
+    return paginator.get_cursor_page(after=request.GET.get('after'))
+
+
+@require_GET
+def post_comments(request, username, post_id):
+    """The next comments of a post, an HTML fragment of the post page."""
+    post = get_object_or_404(
+        Post.objects.select_related('author').only('author__username'),
+        author__username=username,
+        id=post_id
+    )
+    return render(request, 'includes/comment_list.html', {
+        'post': post,
+        'comments': get_comments_page(request, post.comments.all()),
+        'post_url': True,
+    })
+
+
 @login_required
 def post_edit(request, username, post_id):
     if request.user.username != username:
@@ -150,31 +182,68 @@ def add_comment(request, username, post_id):
                     post_id=post_id)
 
 
+@require_GET
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = NumberedPaginator(
+        SearchResults(query),
+        settings.PAGINATOR_POSTS_PER_PAGE,
+        ordering=None
+    )
+    page = attach_thumbnails(paginator.get_page(request.GET.get('page')))
+    groups = SearchResults(query, kind=GROUP)[:settings.SEARCH_GROUPS]
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page': page,
+        'groups': groups,
+        'extra_query': urlencode({'q': query}) + '&',
+    })
+
+
 @require_GET
 @login_required
 def follow_index(request):
-    follow_author_list = Post.objects.filter(
-        author__following__user=request.user
-    )
-    follow_group_list = Post.objects.filter(
-        group__group_following__user=request.user
-    )
-    follow_post_list = follow_author_list | follow_group_list
-    paginator = Paginator(follow_post_list, settings.PAGINATOR_POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = attach_thumbnails(paginate(
+        request,
+        get_feed_queryset(timeline.get_posts(request.user)),
+        ordering=timeline.ORDERING
+    ))
     return render(request, 'posts/follow.html', {'page': page})
 
 
+@login_required
+def follow_import(request):
+    form = FollowImportForm(request.POST or None, files=request.FILES or None)
+    result = form.save(request.user) if form.is_valid() else None
+    return render(request, 'posts/follow_import.html', {
+        'form': form,
+        'result': result,
+    })
+
+
+@require_GET
+@login_required
+def follow_export(request):
+    """Streams the subscriptions of the user as CSV or JSON."""
+    if request.GET.get('format') == 'json':
+        lines = follows.json_lines(request.user)
+        content_type, extension = 'application/json', 'json'
+    else:
+        lines = follows.csv_lines(request.user)
+        content_type, extension = 'text/csv; charset=utf-8', 'csv'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="follows-{request.user.username}.{extension}"'
+    )
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    if author != user and not FollowAuthor.objects.filter(
-        author=author,
-        user=user
-    ).exists():
-        FollowAuthor.objects.create(
+    if author != user:
+        FollowAuthor.objects.get_or_create(
             user=user,
             author=author
         )
@@ -195,14 +264,10 @@ def profile_unfollow(request, username):
 def group_follow(request, slug):
     group = get_object_or_404(Group, slug=slug)
     user = request.user
-    if not FollowGroup.objects.filter(
+    FollowGroup.objects.get_or_create(
         user=user,
         group=group
-    ).exists():
-        FollowGroup.objects.create(
-            user=user,
-            group=group
-        )
+    )
     return redirect('posts:group_posts', slug=slug)
 
 
@@ -0,0 +1,98 @@
+"""Cache configuration and the key scheme shared by all Yatube caches.
+
+The backend is chosen by a URL, normally taken from the `CACHE_URL`
+environment variable:
+
+    locmem://                        per-process memory (the default)
+    file:///var/tmp/yatube_cache     files shared by the processes of a host
+    memcached://10.0.0.1:11211,10.0.0.2:11211
+    redis://:password@10.0.0.1:6379/0
+
+Query parameters set the common options, e.g.
+`redis://127.0.0.1:6379/0?timeout=600&key_prefix=staging`. Only a shared
+backend (file, memcached or redis) lets the workers of one site see each
+other's invalidations.
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_KEY_PREFIX = 'yatube'
+KEY_SEPARATOR = ':'
+# Longer keys are hashed: memcached refuses keys over 250 bytes.
+MAX_KEY_LENGTH = 200
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'pylibmc': 'django.core.cache.backends.memcached.PyLibMCCache',
+    'redis': 'yatube.resp.RespCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+OPTIONS = ('max_entries', 'cull_frequency', 'socket_timeout')
+
+
+def _timeout(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def _location(scheme, url):
+    if scheme == 'file':
+        return url.path
+    if scheme == 'locmem':
+        return url.netloc
+    if scheme in ('memcached', 'pylibmc'):
+        return url.netloc.split(',')
+    if scheme == 'redis':
+        return url._replace(query='', fragment='').geturl()
+    return ''
+
+
+def parse_cache_url(value):
+    """Returns a `CACHES` entry for the cache described by the URL."""
+    url = urlsplit(value)
+    if url.scheme not in BACKENDS:
+        raise ImproperlyConfigured(
+            'Unknown cache backend "{}" in "{}"'.format(url.scheme, value)
+        )
+    config = {
+        'BACKEND': BACKENDS[url.scheme],
+        'LOCATION': _location(url.scheme, url),
+        'KEY_PREFIX': DEFAULT_KEY_PREFIX,
+        'KEY_FUNCTION': 'yatube.caches.make_key',
+        'OPTIONS': {},
+    }
+    for name, option in parse_qsl(url.query):
+        if name == 'timeout':
+            config['TIMEOUT'] = _timeout(option)
+        elif name == 'key_prefix':
+            config['KEY_PREFIX'] = option
+        elif name in OPTIONS:
+            config['OPTIONS'][name.upper()] = int(option)
+        else:
+            raise ImproperlyConfigured(
+                'Unknown cache option "{}" in "{}"'.format(name, value)
+            )
+    return config
+
+
+def make_key(key, key_prefix, version):
+    """
+    Builds `<prefix>:<version>:<key>`. Long keys and keys with spaces
+    or control characters are replaced by their digest, so that every
+    backend accepts them.
+    """
+    if len(key) > MAX_KEY_LENGTH or any(
+            ord(char) < 33 or ord(char) == 127 for char in key):
+        key = 'md5' + KEY_SEPARATOR + hashlib.md5(key.encode()).hexdigest()
+    return KEY_SEPARATOR.join((key_prefix, str(version), key))
+
+
+def cache_key(namespace, *parts):
+    """
+    Returns the key of a Yatube cache entry: the namespace of the
+    feature owning it followed by the parts identifying the entry.
+    """
+    return KEY_SEPARATOR.join([namespace, *map(str, parts)])
@@ -0,0 +1,168 @@
+"""The in-process tier in front of the shared cache.
+
+Hot entries, the first pages of the feed, popular profiles and groups,
+are read from the shared cache by every request of every worker, and a
+read from memcached or Redis costs a round trip and an unpickling.
+`local_cache` keeps the latest of them in the memory of the process:
+a least recently used list of at most LOCAL_CACHE_MAX_BYTES, the size of
+an entry being the size of its pickle, where entries live at most
+LOCAL_CACHE_TIMEOUT seconds.
+
+The local tier is never invalidated by writes: the keys given to it carry
+the version counters held in the shared cache (see `feed.py` and
+`posts/page_cache.py`), which a request reads first anyway, so a purge
+changes the keys and the stale local entries are never asked for again;
+they age out. Values are shared by the threads of the process and must
+not be changed.
+
+`TwoTierCache` is a cache backend reading the local tier before the
+shared cache, for entries whose keys change with their content: the
+post card fragments of the templates, keyed by `Post.updated`, go
+through the `template_fragments` cache of settings.py.
+
+Hits and misses are counted per process here and per request by
+`yatube.metrics`, next to those of the shared cache.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+
+class LocalCache:
+    def __init__(self):
+        # key: (value, expiry on the monotonic clock, size in bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def _drop(self, key):
+        self._size -= self._entries.pop(key)[2]
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= now:
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def get_many(self, keys):
+        """The values of `keys` held by the process."""
+        found = {}
+        with self._lock:
+            now = time.monotonic()
+            for key in keys:
+                hit, value = self._get(key, now)
+                if hit:
+                    found[key] = value
+        metrics.count_local(len(found), len(keys) - len(found))
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, data, timeout=None):
+        """Keeps the values for the shorter of `timeout` and
+        LOCAL_CACHE_TIMEOUT; values bigger than the tier are left out."""
+        limit = settings.LOCAL_CACHE_MAX_BYTES
+        if timeout is None or timeout > settings.LOCAL_CACHE_TIMEOUT:
+            timeout = settings.LOCAL_CACHE_TIMEOUT
+        if not limit or timeout <= 0:
+            return
+        sized = [
+            (key, value, len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            for key, value in data.items()
+        ]
+        with self._lock:
+            expires = time.monotonic() + timeout
+            for key, value, size in sized:
+                if key in self._entries:
+                    self._drop(key)
+                if size > limit:
+                    continue
+                self._entries[key] = (value, expires, size)
+                self._size += size
+            while self._size > limit:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self._size}
+
+
+local_cache = LocalCache()
+
+
+class TwoTierCache(BaseCache):
+    """The local tier in front of the cache named by LOCATION."""
+
+    # Counted by `yatube.metrics` in the tiers it reads.
+    local_tier = True
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._shared = location or DEFAULT_CACHE_ALIAS
+
+    @property
+    def shared(self):
+        return caches[self._shared]
+
+    def _local_key(self, key, version):
+        return 'tiers', self._shared, key, version
+
+    def get(self, key, default=None, version=None):
+        value = local_cache.get(self._local_key(key, version))
+        if value is None:
+            value = self.shared.get(key, version=version)
+            if value is None:
+                return default
+            local_cache.set(self._local_key(key, version), value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        local_cache.set(self._local_key(key, version), value,
+                        None if timeout is DEFAULT_TIMEOUT else timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        local_cache.delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version)
+
+    def delete(self, key, version=None):
+        local_cache.delete(self._local_key(key, version))
+        self.shared.delete(key, version)
+
+    def clear(self):
+        local_cache.clear()
+        self.shared.clear()
@@ -0,0 +1,246 @@
+"""Per-request SQL, template and cache instrumentation.
+
+`collect()` records, for the block it wraps, the number and the total
+time of SQL queries on every database, the queries repeated with the same
+parameters, the time spent rendering templates, the hits and misses of
+the shared cache and of its local tier (see `yatube/local_cache.py`)
+and the cache entries computed or taken from another request's
+computation (see `yatube/stampede.py`). `MetricsMiddleware` wraps every
+request in it, sends the numbers back in a `Server-Timing` header, logs
+them to the `yatube.metrics` logger and warns when a view runs more
+queries than its entry of QUERY_BUDGETS allows:
+
+    db;dur=3.1;desc="5 queries, 1 duplicate", tpl;dur=8.4,
+    cache;desc="3 hits, 1 miss, 1 recompute avoided",
+    local;desc="2 hits, 0 misses", total;dur=14.2
+
+The response keeps the numbers in `response.metrics`, which is what the
+query budget tests read. `recompute_totals` counts the computations of
+the whole process, requests or not, and `local_cache.stats()` the hits
+of its local tier.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+_instrumented = set()
+_MISSING = object()
+
+recompute_totals = Counter()
+_totals_lock = threading.Lock()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.recomputes = 0
+        self.recomputes_avoided = 0
+        self.local_hits = 0
+        self.local_misses = 0
+        self.total_time = 0.0
+        self.view_name = None
+        self._rendering = False
+
+    @property
+    def duplicates(self):
+        """Queries that repeat an earlier one with the same parameters."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def add_query(self, sql, params, duration):
+        self.queries += 1
+        self.sql_time += duration
+        self.statements[sql, repr(params)] += 1
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.queries,
+            'duplicates': self.duplicates,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'recomputes': self.recomputes,
+            'recomputes_avoided': self.recomputes_avoided,
+            'local_hits': self.local_hits,
+            'local_misses': self.local_misses,
+            'total_ms': round(self.total_time * 1000, 1),
+        }
+
+    def server_timing(self):
+        db = _plural(self.queries, 'query', 'queries')
+        if self.duplicates:
+            db += ', ' + _plural(self.duplicates, 'duplicate', 'duplicates')
+        cache = (_plural(self.cache_hits, 'hit', 'hits') + ', '
+                 + _plural(self.cache_misses, 'miss', 'misses'))
+        if self.recomputes_avoided:
+            cache += ', ' + _plural(self.recomputes_avoided,
+                                    'recompute avoided', 'recomputes avoided')
+        local = (_plural(self.local_hits, 'hit', 'hits') + ', '
+                 + _plural(self.local_misses, 'miss', 'misses'))
+        return (
+            f'db;dur={self.sql_time * 1000:.1f};desc="{db}", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'cache;desc="{cache}", '
+            f'local;desc="{local}", '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+def _plural(count, one, many):
+    return f'{count} {one if count == 1 else many}'
+
+
+def count_recompute(avoided=False):
+    """Counts a cache entry computed, or got without computing it."""
+    name = 'recomputes_avoided' if avoided else 'recomputes'
+    with _totals_lock:
+        recompute_totals[name] += 1
+    metrics = _current.get()
+    if metrics is not None:
+        setattr(metrics, name, getattr(metrics, name) + 1)
+
+
+def count_local(hits, misses):
+    """Counts the hits and misses of the local cache tier."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.local_hits += hits
+        metrics.local_misses += misses
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, params, time.perf_counter() - started)
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        metrics = _current.get()
+        # Included templates are part of the outermost one.
+        if metrics is None or metrics._rendering:
+            return render(self, context)
+        metrics._rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics._rendering = False
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, _MISSING, version)
+        metrics = _current.get()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        found = get_many(self, keys, version)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
+
+
+def _instrument_cache(backend):
+    # Two-tier backends are counted in the tiers they read.
+    if backend in _instrumented or getattr(backend, 'local_tier', False):
+        return
+    backend.get = _counted_get(backend.get)
+    # The default `get_many` calls `get`, which is counted already.
+    if backend.get_many is not BaseCache.get_many:
+        backend.get_many = _counted_get_many(backend.get_many)
+    _instrumented.add(backend)
+
+
+def install():
+    """Hooks template rendering and the configured cache backends once."""
+    if Template not in _instrumented:
+        Template.render = _timed_render(Template.render)
+        _instrumented.add(Template)
+    for alias in settings.CACHES:
+        _instrument_cache(type(caches[alias]))
+
+
+@contextmanager
+def collect():
+    """Collects the metrics of the wrapped block into a `RequestMetrics`."""
+    install()
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_record_query))
+            yield metrics
+    finally:
+        metrics.total_time = time.perf_counter() - started
+        _current.reset(token)
+
+
+class MetricsMiddleware:
+    """Measures every request; goes first in MIDDLEWARE to see them all."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        with collect() as metrics:
+            response = self.get_response(request)
+        match = request.resolver_match
+        metrics.view_name = match.view_name if match else None
+        response['Server-Timing'] = metrics.server_timing()
+        response.metrics = metrics
+        budget = settings.QUERY_BUDGETS.get(metrics.view_name)
+        over_budget = budget is not None and metrics.queries > budget
+        record = metrics.as_dict()
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            ' '.join(f'{name}={value}' for name, value in record.items())
+            + (f' budget={budget}' if over_budget else ''),
+            extra={'metrics': record, 'path': request.path,
+                   'status': response.status_code}
+        )
+        return response
@@ -0,0 +1,301 @@
+"""A cache backend speaking the Redis protocol (RESP).
+
+Only a handful of plain commands are used, so the backend works with
+Redis, its compatible servers and the stand-in of `resp_server.py`.
+Every thread keeps its own connection; commands of one call are
+pipelined, i.e. sent in one write. A command is sent again on a new
+connection only when not a byte of it reached the old one, so that a
+write is never applied twice.
+
+Integers are stored as decimal strings so that `incr` is done by the
+server atomically; every other value is pickled.
+"""
+import pickle
+import select
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+DEFAULT_PORT = 6379
+DEFAULT_SOCKET_TIMEOUT = 5
+
+
+class ResponseError(Exception):
+    """An error reply of the server."""
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def pack_command(*args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in map(_to_bytes, args):
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(stream):
+    """
+    Reads one reply (or, on the server side, one command) from `stream`.
+    Error replies are returned as `ResponseError` instances so that the
+    rest of a pipeline can still be read.
+    """
+    line = stream.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('Connection closed by the other side')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode()
+    if kind == b'-':
+        return ResponseError(payload.decode())
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError('Connection closed by the other side')
+        return data[:-2]
+    if kind == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise ConnectionError('Malformed reply {!r}'.format(line))
+
+
+class Connection:
+    def __init__(self, address, timeout):
+        self.socket = socket.create_connection(address, timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.socket.makefile('rb')
+        # Whether a byte of the last commands was sent.
+        self.written = False
+
+    def is_stale(self):
+        """
+        Whether the server has closed the connection. No reply is due on
+        an idle connection, so it is readable only when closed.
+        """
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def execute(self, commands):
+        """Sends `commands` at once and returns their replies."""
+        data = memoryview(b''.join(pack_command(*args) for args in commands))
+        self.written = False
+        while data:
+            data = data[self.socket.send(data):]
+            self.written = True
+        replies = [read_reply(self.stream) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, ResponseError):
+                raise reply
+        return replies
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+
+class RespCache(BaseCache):
+    """
+    LOCATION is `redis://[:password@]host[:port][/db]`; OPTIONS may set
+    SOCKET_TIMEOUT in seconds.
+
+    `clear()` flushes the whole database, so a database should not be
+    shared with anything but caches of the same site.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlsplit(server if '//' in server else '//' + server)
+        self._address = (url.hostname or '127.0.0.1',
+                         url.port or DEFAULT_PORT)
+        self._password = url.password
+        self._db = int(url.path.strip('/') or 0)
+        options = params.get('OPTIONS', {})
+        self._socket_timeout = options.get('SOCKET_TIMEOUT',
+                                           DEFAULT_SOCKET_TIMEOUT)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = Connection(self._address, self._socket_timeout)
+            setup = []
+            if self._password:
+                setup.append(('AUTH', self._password))
+            if self._db:
+                setup.append(('SELECT', self._db))
+            if setup:
+                connection.execute(setup)
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, *commands):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and connection.is_stale():
+            # Dropped by the server while idle.
+            self.disconnect()
+            connection = None
+        reused = connection is not None
+        connection = self._connection()
+        try:
+            return connection.execute(commands)
+        except OSError:
+            self.disconnect()
+            # Once sent, the commands may have been applied: only those
+            # refused outright by an old connection are sent again.
+            if not reused or connection.written:
+                raise
+        return self._connection().execute(commands)
+
+    def _expiry(self, timeout):
+        """Milliseconds to live, or None for entries that never expire."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return int(timeout * 1000)
+
+    def _expired(self, timeout):
+        """Whether entries stored with `timeout` expire at once."""
+        expiry = self._expiry(timeout)
+        return expiry is not None and expiry <= 0
+
+    def _set_command(self, key, value, timeout, *flags):
+        command = ['SET', key, self._encode(value), *flags]
+        expiry = self._expiry(timeout)
+        if expiry is not None:
+            command += ['PX', max(expiry, 1)]
+        return command
+
+    def _encode(self, value):
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if self._expired(timeout):
+            return not self._execute(('EXISTS', key))[0]
+        reply, = self._execute(self._set_command(key, value, timeout, 'NX'))
+        return reply is not None
+
+    def get(self, key, default=None, version=None):
+        data, = self._execute(('GET', self._key(key, version)))
+        return default if data is None else self._decode(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if self._expired(timeout):
+            self._execute(('DEL', key))
+        else:
+            self._execute(self._set_command(key, value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            exists, _ = self._execute(('EXISTS', key), ('PERSIST', key))
+            return bool(exists)
+        if expiry <= 0:
+            return bool(self._execute(('DEL', key))[0])
+        return bool(self._execute(('PEXPIRE', key, expiry))[0])
+
+    def delete(self, key, version=None):
+        return bool(self._execute(('DEL', self._key(key, version)))[0])
+
+    def has_key(self, key, version=None):
+        return bool(self._execute(('EXISTS', self._key(key, version)))[0])
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        # INCRBY would create a missing key from zero. WATCH makes the
+        # transaction fail when the key is changed or expires after
+        # EXISTS, and it is then tried again.
+        while True:
+            _, exists = self._execute(('WATCH', key), ('EXISTS', key))
+            if not exists:
+                self._execute(('UNWATCH',))
+                raise ValueError("Key '%s' not found" % key)
+            # On the connection holding the WATCH, never sent again.
+            connection = self._local.connection
+            try:
+                _, _, replies = connection.execute(
+                    [('MULTI',), ('INCRBY', key, delta), ('EXEC',)]
+                )
+            except OSError:
+                self.disconnect()
+                raise
+            if replies is not None:
+                break
+        value, = replies
+        if isinstance(value, ResponseError):
+            raise ValueError(str(value))
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        stored = [self._key(key, version) for key in keys]
+        values, = self._execute(('MGET', *stored))
+        return {
+            key: self._decode(data)
+            for key, data in zip(keys, values) if data is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._expired(timeout):
+            self.delete_many(data, version=version)
+        elif data:
+            self._execute(*(
+                self._set_command(self._key(key, version), value, timeout)
+                for key, value in data.items()
+            ))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute(('DEL', *keys))
+
+    def clear(self):
+        self._execute(('FLUSHDB',))
+
+    def close(self, **kwargs):
+        # Django closes caches after every request; the connection of
+        # the thread is kept for the next one instead.
+        pass
+
+    def disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
@@ -0,0 +1,225 @@
+"""An in-process stand-in for a Redis server.
+
+It understands the commands used by `resp.RespCache` and keeps the data
+in memory, which is enough to share a cache between the processes of a
+development machine or of the test suite without installing Redis:
+
+    server = StandInServer().start()
+    ...  # CACHE_URL=server.url in other processes
+    server.stop()
+
+Expired keys are removed lazily, when they are accessed. Transactions,
+MULTI and EXEC, can be made conditional with WATCH like in Redis.
+"""
+import socketserver
+import threading
+import time
+from collections import defaultdict
+
+from .resp import ResponseError, read_reply
+
+
+def pack_reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, ResponseError):
+        return b'-ERR %s\r\n' % str(value).encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(map(pack_reply, value))
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Serves the commands of one client connection."""
+
+    # Commands run at once inside a transaction.
+    TRANSACTION = (b'EXEC', b'DISCARD', b'MULTI', b'WATCH')
+
+    def handle(self):
+        self.db = 0
+        # Entries of the watched keys, as they were when watched.
+        self.watched = {}
+        # Commands of the open transaction.
+        self.queued = None
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not command or not isinstance(command, list):
+                return
+            name, *args = command
+            method = getattr(self, 'do_' + name.decode().lower(), None)
+            if method is None:
+                reply = ResponseError(
+                    "unknown command '{}'".format(name.decode())
+                )
+            elif (self.queued is not None
+                    and name.upper() not in self.TRANSACTION):
+                self.queued.append((method, args))
+                reply = 'QUEUED'
+            else:
+                with self.server.lock:
+                    reply = self._run(method, args)
+            self.wfile.write(pack_reply(reply))
+
+    @property
+    def data(self):
+        return self.server.databases[self.db]
+
+    def _get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _expires(self, milliseconds):
+        return time.monotonic() + int(milliseconds) / 1000
+
+    def _run(self, method, args):
+        try:
+            return method(*args)
+        except (TypeError, ValueError) as error:
+            return ResponseError(str(error) or 'syntax error')
+
+    def do_watch(self, *keys):
+        if self.queued is not None:
+            raise ValueError('WATCH inside MULTI is not allowed')
+        for key in keys:
+            self._get(key)
+            self.watched[self.db, key] = self.data.get(key)
+        return 'OK'
+
+    def do_unwatch(self):
+        self.watched = {}
+        return 'OK'
+
+    def do_multi(self):
+        if self.queued is not None:
+            raise ValueError('MULTI calls can not be nested')
+        self.queued = []
+        return 'OK'
+
+    def do_discard(self):
+        if self.queued is None:
+            raise ValueError('DISCARD without MULTI')
+        self.queued = None
+        self.watched = {}
+        return 'OK'
+
+    def do_exec(self):
+        if self.queued is None:
+            raise ValueError('EXEC without MULTI')
+        queued, self.queued = self.queued, None
+        watched, self.watched = self.watched, {}
+        for (db, key), entry in watched.items():
+            data = self.server.databases[db]
+            expires = data.get(key, (None, None))[1]
+            if (data.get(key) is not entry or expires is not None
+                    and expires <= time.monotonic()):
+                # Changed, or expired, since it was watched.
+                return None
+        return [self._run(method, args) for method, args in queued]
+
+    def do_ping(self):
+        return 'PONG'
+
+    def do_auth(self, password):
+        return 'OK'
+
+    def do_select(self, db):
+        self.db = int(db)
+        return 'OK'
+
+    def do_get(self, key):
+        return self._get(key)
+
+    def do_mget(self, *keys):
+        return [self._get(key) for key in keys]
+
+    def do_set(self, key, value, *flags):
+        flags = [flag.upper() for flag in flags]
+        expires = None
+        if b'PX' in flags:
+            expires = self._expires(flags[flags.index(b'PX') + 1])
+        elif b'EX' in flags:
+            expires = self._expires(int(flags[flags.index(b'EX') + 1]) * 1000)
+        exists = self._get(key) is not None
+        if b'NX' in flags and exists or b'XX' in flags and not exists:
+            return None
+        self.data[key] = (value, expires)
+        return 'OK'
+
+    def do_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def do_exists(self, *keys):
+        return sum(self._get(key) is not None for key in keys)
+
+    def do_incrby(self, key, delta):
+        value = self._get(key)
+        try:
+            value = int(value or 0) + int(delta)
+        except ValueError:
+            raise ValueError('value is not an integer or out of range')
+        expires = self.data.get(key, (None, None))[1]
+        self.data[key] = (str(value).encode(), expires)
+        return value
+
+    def do_incr(self, key):
+        return self.do_incrby(key, 1)
+
+    def do_pexpire(self, key, milliseconds):
+        value = self._get(key)
+        if value is None:
+            return 0
+        self.data[key] = (value, self._expires(milliseconds))
+        return 1
+
+    def do_persist(self, key):
+        value = self._get(key)
+        if value is None or self.data[key][1] is None:
+            return 0
+        self.data[key] = (value, None)
+        return 1
+
+    def do_dbsize(self):
+        return len(self.data)
+
+    def do_flushdb(self):
+        self.data.clear()
+        return 'OK'
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """Listens on `address`; port 0 picks a free port."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, CommandHandler)
+        self.databases = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'redis://{}:{}/0'.format(host, port)
+
+    def start(self):
+        """Serves clients from a background thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,122 @@
+"""Reads from replicas of the database, writes to the primary.
+
+Replicas are copies of the primary database listed in the
+`DATABASE_REPLICAS` environment variable, a comma-separated list of
+SQLite files kept in sync by `manage.py sync_replicas`:
+
+    DATABASE_REPLICAS=/srv/yatube/replica1.sqlite3 gunicorn yatube.wsgi
+    python manage.py sync_replicas --interval 5
+
+`ReplicaMiddleware` lets the GET requests of the views named in
+REPLICA_READ_VIEWS read from a replica, one picked per request; other
+requests, management commands, transactions and sessions read from the
+primary. Every write goes to the primary. A client whose request wrote
+anything gets a cookie that sends all its reads to the primary for
+REPLICA_PIN_SECONDS, longer than replicas lag behind, so it sees its own
+posts, comments and follows. Pages of the main feed are cached for all
+clients under the feed version and are built from the primary inside
+`primary_reads()`.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD')
+# Read from the primary always: a session missing from a replica would
+# sign its user out.
+PRIMARY_APP_LABELS = ('sessions',)
+
+# Routing of the request being handled, None outside of requests.
+_routing = contextvars.ContextVar('yatube_routing', default=None)
+
+
+def replica_databases(primary, paths):
+    """`DATABASES` entries of replicas like `primary` stored at `paths`."""
+    return {
+        f'replica{number}': {
+            **primary,
+            'NAME': path,
+            # Tests read the test database of the primary instead.
+            'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+        }
+        for number, path in enumerate(paths, 1)
+    }
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the reads of the block to the primary, for entries cached for
+    every client under versions a lagging replica would not match.
+    """
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class Routing:
+    def __init__(self):
+        # The replica to read from, None for the primary.
+        self.replica = None
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (routing is None or routing.replica is None
+                or model._meta.app_label in PRIMARY_APP_LABELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema with the data from the primary.
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaMiddleware:
+    """Routes the reads of a request; goes before the session middleware
+    so that a session saved by the request pins the client as well."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = Routing()
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE_NAME, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if (routing is not None and settings.REPLICA_DATABASES
+                and request.method in SAFE_METHODS
+                and request.resolver_match.view_name
+                in settings.REPLICA_READ_VIEWS
+                and settings.REPLICA_PIN_COOKIE_NAME not in request.COOKIES):
+            routing.replica = random.choice(settings.REPLICA_DATABASES)
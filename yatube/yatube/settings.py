@@ -12,6 +12,10 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from pathlib import Path
 
+from yatube.caches import parse_cache_url
+from yatube.routers import replica_databases
+from yatube.sqlite import database_profile
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +56,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.routers.ReplicaMiddleware',
+    'posts.page_cache.AnonymousPageCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.paginators.CursorRedirectMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -91,17 +99,48 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# PRAGMAs and persistent connections are chosen by a profile, see
+# yatube/sqlite.py: `production` on servers.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': str(os.path.join(BASE_DIR, "db.sqlite3")),
-    }
+    'default': database_profile(
+        os.environ.get('DATABASE_PROFILE', 'default'),
+        str(os.path.join(BASE_DIR, "db.sqlite3")),
+    ),
 }
 
+# Read replicas of the database, see yatube/routers.py.
+DATABASES.update(replica_databases(DATABASES['default'], [
+    path for path in os.environ.get('DATABASE_REPLICAS', '').split(',')
+    if path
+]))
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+
+# Views whose GET requests may read from a replica. The main feed is
+# built from the primary, see posts/feed.py.
+REPLICA_READ_VIEWS = {
+    'posts:all_groups', 'posts:group_posts', 'posts:profile',
+    'posts:post', 'posts:comments', 'posts:follow_index', 'posts:search',
+    'api:index', 'api:group_posts', 'api:profile', 'api:follow_index',
+    'api:post', 'api:comments',
+}
+# Clients that wrote read from the primary for this long: it must be
+# longer than the interval of `manage.py sync_replicas`.
+REPLICA_PIN_SECONDS = 30
+REPLICA_PIN_COOKIE_NAME = 'primary'
+
+# The cache is described by a URL, see yatube/caches.py. Several worker
+# processes need a shared backend (file, memcached or redis) to see each
+# other's invalidations; `manage.py run_cache_server` starts a local
+# Redis-compatible server for development.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': parse_cache_url(os.environ.get('CACHE_URL', 'locmem://')),
+    # `{% cache %}` fragments, read from the local tier of the process
+    # first, see yatube/local_cache.py.
+    'template_fragments': {
+        'BACKEND': 'yatube.local_cache.TwoTierCache',
+        'LOCATION': 'default',
+    },
 }
 
 # Password validation
@@ -138,6 +177,121 @@ USE_TZ = True
 
 PAGINATOR_POSTS_PER_PAGE = 10
 
+# Latest comments shown under every post of a list.
+FEED_COMMENTS_PER_POST = 3
+# Comments on a page of a post; the next ones are loaded by
+# `posts:comments` on request.
+COMMENTS_PER_PAGE = 50
+
+# Latest posts of an author or a group copied into the follow feed of a
+# new subscriber.
+TIMELINE_BACKFILL_SIZE = 1000
+
+# Characters of a post shown on list pages, see posts/sanitize.py.
+POST_EXCERPT_LENGTH = 300
+
+# Pages reachable by number. Deeper pages are reached by cursor.
+PAGINATOR_NUMBERED_PAGES = 5
+
+# Seconds a page of the main feed lives in the cache. Writes to posts and
+# comments invalidate it earlier.
+INDEX_CACHE_TIMEOUT = 60 * 5
+# Pages of the main feed that are cached, numbered and cursor ones
+# together; deeper pages are read from the database on every request.
+INDEX_CACHED_PAGES = 10
+
+# The in-process tier in front of the shared cache, see
+# yatube/local_cache.py: at most this many bytes of pickled entries per
+# process, each kept at most LOCAL_CACHE_TIMEOUT seconds. 0 turns it off.
+LOCAL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LOCAL_CACHE_TIMEOUT = 10
+
+# Cache entries computed by one request at a time, see yatube/stampede.py.
+# Expired entries are served for CACHE_STALE_SECONDS more while one request
+# recomputes them; the others wait up to CACHE_LOCK_WAIT seconds for a
+# missing entry, polling every CACHE_LOCK_POLL. A lock is dropped after
+# CACHE_LOCK_TIMEOUT, when its holder has died. A higher
+# CACHE_EARLY_RECOMPUTE_BETA recomputes entries earlier before they expire.
+CACHE_STALE_SECONDS = 60
+CACHE_LOCK_WAIT = 3
+CACHE_LOCK_POLL = 0.02
+CACHE_LOCK_TIMEOUT = 30
+CACHE_EARLY_RECOMPUTE_BETA = 1.0
+
+# Views whose pages are cached whole for guests, see posts/page_cache.py.
+# Writes purge the pages they change earlier; 0 turns the cache off.
+PAGE_CACHE_VIEWS = {
+    'posts:index', 'posts:all_groups', 'posts:group_posts', 'posts:profile',
+    'posts:post',
+}
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Seconds a proxy in front of the site may share a cached page.
+PAGE_CACHE_PROXY_SECONDS = 30
+
+
+# Search backend, see posts/search.py: 'fts5', 'index' or None to use
+# FTS5 where SQLite has it. Run `manage.py rebuild_search_index` after
+# switching.
+SEARCH_BACKEND = None
+
+# Groups shown above the posts found by a search.
+SEARCH_GROUPS = 5
+
+# Thumbnails built ahead of time for every post image: a geometry, as
+# understood by sorl-thumbnail, mapped to the options of the thumbnail.
+POST_THUMBNAILS = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+
+# Seconds the thumbnails of a post are kept in the cache for pages, see
+# `posts.feed.attach_thumbnails`; the keys change with the post.
+POST_THUMBNAILS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Threads of a web process building thumbnails after the post is saved.
+# With 0 the jobs wait for `manage.py process_thumbnails`.
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+
+# Seconds after which a job left running, e.g. by a killed process, is
+# queued again by `manage.py process_thumbnails`.
+THUMBNAIL_JOB_TIMEOUT = 60 * 10
+
+# Most subscriptions changed by one import, see posts/follows.py.
+FOLLOW_IMPORT_LIMIT = 1000
+
+# Most objects on a page of the JSON API, see posts/api.py.
+API_MAX_PAGE_SIZE = 100
+
+# Most SQL queries a view may run for a signed-in user, whatever the
+# number of posts on the page, the ETag query of posts/conditional.py
+# included. Checked by `yatube.metrics` on every request and by
+# posts/tests/test_metrics.py; views left out are not checked.
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_posts': 8,
+    'posts:profile': 9,
+    'posts:post': 8,
+    'posts:comments': 2,
+    'posts:follow_index': 6,
+    'posts:search': 8,
+}
+
+# Per-request metrics of `yatube.metrics` are logged at INFO, requests
+# over their query budget at WARNING.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
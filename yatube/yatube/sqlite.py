@@ -0,0 +1,75 @@
+"""Profiles of the SQLite database.
+
+The profile is chosen by the `DATABASE_PROFILE` environment variable:
+
+    default      SQLite defaults and a connection per request
+    production   write-ahead log, memory-mapped reads, a larger page
+                 cache and connections kept between requests
+
+With the write-ahead log readers don't wait for a writer and a writer
+doesn't wait for readers; writers still take turns, waiting up to
+`busy_timeout` milliseconds for each other. The PRAGMAs of a profile are
+run on every new connection by `apply_pragmas`, a `connection_created`
+receiver registered when the settings import this module.
+
+    DATABASE_PROFILE=production gunicorn yatube.wsgi
+
+`manage.py bench_sqlite` compares the profiles on a copy of the database.
+"""
+import copy
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+
+PROFILES = {
+    'default': {
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {},
+    },
+    'production': {
+        # Seconds a worker thread keeps its connection.
+        'CONN_MAX_AGE': 600,
+        'PRAGMAS': {
+            'journal_mode': 'wal',
+            # Commits survive a crash of the process, not a power loss:
+            # the log is synced at checkpoints only.
+            'synchronous': 'normal',
+            'mmap_size': 256 * 2 ** 20,
+            # Negative sizes are in kibibytes: 64 MiB per connection.
+            'cache_size': -64 * 2 ** 10,
+            'busy_timeout': 5000,
+            'temp_store': 'memory',
+        },
+    },
+}
+
+
+def database_profile(name, path):
+    """Returns the `DATABASES` entry of the SQLite database at `path`."""
+    if name not in PROFILES:
+        raise ImproperlyConfigured(
+            'Unknown database profile "{}", expected one of: {}'.format(
+                name, ', '.join(PROFILES)
+            )
+        )
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        **copy.deepcopy(PROFILES[name]),
+    }
+
+
+def run_pragmas(db, pragmas):
+    """Runs `pragmas` on a DB-API connection to SQLite."""
+    for name, value in pragmas.items():
+        db.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        run_pragmas(connection.connection,
+                    connection.settings_dict.get('PRAGMAS') or {})
+
+
+connection_created.connect(apply_pragmas,
+                           dispatch_uid='yatube.sqlite.apply_pragmas')
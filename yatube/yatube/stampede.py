@@ -0,0 +1,137 @@
+"""Cache entries recomputed by one request at a time.
+
+`get_or_compute()` reads an entry of a Yatube cache and computes it when
+it is missing. Three things keep an entry that expires from sending
+every concurrent request to the database at once:
+
+* Single flight: the request that misses takes a lock, an `add` of
+  `<key>:lock`, and computes the value; the others wait for the value,
+  up to CACHE_LOCK_WAIT seconds, instead of computing it too.
+* Early recomputation: an entry keeps the time its computation took, and
+  a request recomputes it before it expires with a probability that
+  grows as the expiry comes closer and with that time (the "XFetch" rule
+  of Vattani et al., scaled by CACHE_EARLY_RECOMPUTE_BETA), so a popular
+  entry is usually refreshed before anybody misses it.
+* Stale while revalidate: an entry stays in the cache CACHE_STALE_SECONDS
+  past its timeout, and while one request recomputes it the others get
+  the old value.
+
+Entries of the default cache are also kept in the local tier of the
+process, see `yatube/local_cache.py`, which is read first; it drops
+them when they expire, so stale ones are always read from the shared
+cache. Computations and the requests that got a value without one are
+counted by `yatube.metrics`.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from . import metrics
+from .caches import KEY_SEPARATOR
+from .local_cache import local_cache
+
+_MISSING = object()
+
+
+def _lock_key(key):
+    return key + KEY_SEPARATOR + 'lock'
+
+
+def _acquire(cache, key):
+    """A token of the lock of `key`, None when it is taken."""
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, timeout=settings.CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def _release(cache, key, token):
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _needs_refresh(expires, cost):
+    if expires is None:
+        return False
+    # -log(u) for u in (0, 1] is exponentially distributed.
+    early = -cost * settings.CACHE_EARLY_RECOMPUTE_BETA * math.log(
+        1 - random.random()
+    )
+    return time.time() + early >= expires
+
+
+def _remaining(entry):
+    """Seconds until the entry expires, None if it does not."""
+    return None if entry[1] is None else entry[1] - time.time()
+
+
+def _wait(cache, key):
+    """The value computed by the lock holder, _MISSING if none comes."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(settings.CACHE_LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.get(_lock_key(key)) is None:
+            # Released without a value: the result was not cacheable.
+            break
+    return _MISSING
+
+
+def _compute(cache, key, compute, timeout, token, local):
+    started = time.monotonic()
+    try:
+        value = compute()
+        if value is not None:
+            entry = (value,
+                     None if timeout is None else time.time() + timeout,
+                     time.monotonic() - started)
+            cache.set(key, entry, timeout=(
+                None if timeout is None
+                else timeout + settings.CACHE_STALE_SECONDS
+            ))
+            if local:
+                local_cache.set(key, entry, timeout)
+    finally:
+        if token is not None:
+            _release(cache, key, token)
+    metrics.count_recompute()
+    return value
+
+
+def get_or_compute(key, compute, timeout, cache=None):
+    """
+    Returns the value cached under `key`, computed by `compute()` and
+    cached for `timeout` seconds when missing. A None from `compute` is
+    returned without being cached. Entries of the default cache are kept
+    in the local tier of the process as well.
+    """
+    local = cache is None
+    cache = cache or default_cache
+    entry = local_cache.get(key) if local else None
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None and local:
+            local_cache.set(key, entry, _remaining(entry))
+    if entry is not None:
+        value, expires, cost = entry
+        if not _needs_refresh(expires, cost):
+            return value
+        token = _acquire(cache, key)
+        if token is None:
+            # Being recomputed: the current value will do meanwhile.
+            metrics.count_recompute(avoided=True)
+            return value
+        return _compute(cache, key, compute, timeout, token, local)
+    token = _acquire(cache, key)
+    if token is None:
+        value = _wait(cache, key)
+        if value is not _MISSING:
+            metrics.count_recompute(avoided=True)
+            return value
+    return _compute(cache, key, compute, timeout, token, local)
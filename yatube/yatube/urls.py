@@ -22,6 +22,9 @@ urlpatterns = [
     # информационный раздел
     path('about/', include('about.urls', namespace='about')),
 
+    #  JSON API для мобильного клиента
+    path('api/v1/', include('posts.api_urls')),
+
     #  обработчик для главной страницы ищем в urls.py приложения posts
     path("", include("posts.urls")),
 ]